@@ -1,9 +1,19 @@
+import base64
+import json
+import logging
+from contextlib import asynccontextmanager
+from time import perf_counter
 from datetime import date
-from typing import List
+from itertools import islice
+from typing import List, Tuple
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+from datetime import datetime, time, timedelta
 from .models import (
     Patient,
     Appointment,
@@ -12,84 +22,138 @@ from .models import (
     RiskPreviewResponse,
     AvailableSlotsRequest,
     AvailableSlotsResponse,
+    AvailableSlot,
+    ClinicalRisk,
     RecommendedSlot,
     BookAppointmentRequest,
     BookingSummary,
     ClinicianScheduleItem,
     IntakeRequest, IntakeResponse,
+    IntakeBatchRequest, IntakeBatchItem, IntakeBatchResponse,
     PatientAppointmentsResponse,
 )
-from .services import data_access, risk_engine, prep_engine,intake_engine
+from .responses import model_response
+from .services import (
+    data_access, llm_client, metrics, tracing, risk_engine, prep_engine, prep_queue, intake_engine,
+)
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parse + validate the JSON data once, instead of on every request
+    data_access.warm_cache()
+    await prep_queue.start()
+    yield
+    await prep_queue.stop()
+    # Flush + fold the booking journal back into appointments.json
+    data_access.close()
+    await llm_client.aclose()
 
 
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Beam AI Risk & Prep MVP")
+app = FastAPI(title="Beam AI Risk & Prep MVP", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    """
+    Latency metrics + per-request phase timings (Server-Timing header and
+    one JSON log line), plus a sampled profile of the request when
+    profiling is enabled (see tracing.start_profiler).
+    """
+    profiler = tracing.start_profiler(
+        "1" in (request.headers.get("x-profile"), request.query_params.get("profile"))
+    )
+
+    token = tracing.start_request()
+    started = perf_counter()
+    response = None
+    try:
+        response = await call_next(request)
+        return response
+    finally:
+        elapsed = perf_counter() - started
+        spans = tracing.finish_request(token)
+        status = response.status_code if response is not None else 500
+        # Route template (/prep-summary/{appointment_id}), not the raw path
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.http_request_duration.observe(
+            elapsed, method=request.method, route=route, status=status
+        )
+
+        profile = None
+        if profiler is not None:
+            # Joins the sampler thread and writes the file: not on the loop
+            profile = str(await run_in_threadpool(profiler.finish, f"{request.method} {route}"))
+        if response is not None:
+            response.headers["Server-Timing"] = tracing.server_timing(spans, elapsed)
+            response.headers["Timing-Allow-Origin"] = "*"
+        tracing.log_request(
+            request.method, route, request.url.path, status, elapsed, spans, profile
+        )
+
+
 @app.get("/patients", response_model=List[Patient])
-def list_patients(query: str | None = Query(default=None)):
-    patients = data_access.load_patients()
-    if query:
-        q = query.lower()
-        patients = [
-            p
-            for p in patients
-            if q in p.first_name.lower()
-            or q in p.last_name.lower()
-            or q in p.email.lower()
-            or q in p.phone.lower()
-        ]
-    return patients
+def list_patients(
+    response: Response,
+    query: str | None = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: str | None = Query(default=None),
+):
+    # Ranked prefix / substring match on name, email and phone digits.
+    # The cursor for the next page (if any) comes back in X-Next-Cursor.
+    try:
+        patients, next_cursor = data_access.search_patients(query, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    response.headers.update(headers)
+    return model_response(patients, List[Patient], headers)
 
 
 @app.post("/risk/preview", response_model=RiskPreviewResponse)
-def preview_risk(req: RiskPreviewRequest):
-    patients = data_access.load_patients()
-    insurances = data_access.load_insurances()
-    appointments = data_access.load_appointments()
-
-    patient = data_access.find_patient(patients, req.patient_id)
+async def preview_risk(req: RiskPreviewRequest):
+    patient = data_access.get_patient(req.patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    insurance = data_access.find_insurance(insurances, patient.insurance_id)
+    insurance = data_access.get_insurance(patient.insurance_id)
     if not insurance:
         raise HTTPException(status_code=404, detail="Insurance not found")
 
-    risk = risk_engine.calculate_risk(
+    risk = await risk_engine.calculate_risk(
         patient=patient,
         insurance=insurance,
         proposed_reason=req.reason_for_visit,
-        existing_appointments=appointments,
+        history=data_access.patient_history(patient.id),
     )
 
-    return RiskPreviewResponse(risk=risk)
+    return model_response(RiskPreviewResponse(risk=risk), RiskPreviewResponse)
 
 
 @app.get("/appointments/{appointment_id}/details", response_model=BookingSummary)
 def get_appointment_details(appointment_id: int):
-    patients = data_access.load_patients()
-    insurances = data_access.load_insurances()
-    appointments = data_access.load_appointments()
-
-    appt = data_access.find_appointment(appointments, appointment_id)
+    appt = data_access.get_appointment(appointment_id)
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
     if not appt.patient_id or appt.status != "booked":
         raise HTTPException(status_code=400, detail="Appointment is not booked")
 
-    patient = data_access.find_patient(patients, appt.patient_id)
+    patient = data_access.get_patient(appt.patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    insurance = data_access.find_insurance(insurances, patient.insurance_id)
+    insurance = data_access.get_insurance(patient.insurance_id)
     if not insurance:
         raise HTTPException(status_code=404, detail="Insurance not found")
 
@@ -97,80 +161,116 @@ def get_appointment_details(appointment_id: int):
     risk = appt.clinical_risk
     prep_summary = appt.prep_summary
 
-    return BookingSummary(
+    summary = BookingSummary(
         appointment=appt,
         patient=patient,
         insurance=insurance,
         risk=risk,
         prep_summary=prep_summary,
     )
+    return model_response(summary, BookingSummary)
 
 
 @app.get("/patients/{patient_id}/appointments", response_model=PatientAppointmentsResponse)
 def get_patient_appointments(patient_id: int):
-    patients = data_access.load_patients()
-    appointments = data_access.load_appointments()
-
-    patient = data_access.find_patient(patients, patient_id)
+    patient = data_access.get_patient(patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    # Only show booked appointments for this patient
-    booked = [
-        a for a in appointments
-        if a.patient_id == patient.id and a.status == "booked"
-    ]
-
-    # Optionally sort by start time
-    booked = sorted(booked, key=lambda a: a.start)
+    # Only show booked appointments for this patient (sorted by start time)
+    booked = data_access.appointments_for_patient(patient.id, status="booked")
 
-    return PatientAppointmentsResponse(appointments=booked)
+    return model_response(PatientAppointmentsResponse(appointments=booked), PatientAppointmentsResponse)
 
 
 @app.post("/intake/structure", response_model=IntakeResponse)
-def intake_structure(req: IntakeRequest):
-    patients = data_access.load_patients()
-    patient = data_access.find_patient(patients, req.patient_id)
+async def intake_structure(req: IntakeRequest):
+    patient = data_access.get_patient(req.patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    result = intake_engine.run_intake(patient=patient, free_text=req.narrative)
-    return IntakeResponse(**result)
+    result = await intake_engine.run_intake(patient=patient, free_text=req.narrative)
+    return model_response(IntakeResponse(**result), IntakeResponse)
 
 
-@app.post("/appointments/available", response_model=AvailableSlotsResponse)
-def available_slots(req: AvailableSlotsRequest):
-    patients = data_access.load_patients()
-    insurances = data_access.load_insurances()
-    appointments = data_access.load_appointments()
+# 📥 Many narratives at once (front-desk imports)
+@app.post("/intake/structure/batch", response_model=IntakeBatchResponse)
+async def intake_structure_batch(req: IntakeBatchRequest):
+    results: List[IntakeBatchItem] = [
+        IntakeBatchItem(index=i, patient_id=item.patient_id) for i, item in enumerate(req.items)
+    ]
+
+    # Unknown patients fail on their own; the rest go out together
+    todo = []
+    for i, item in enumerate(req.items):
+        patient = data_access.get_patient(item.patient_id)
+        if patient is None:
+            results[i].error = "Patient not found"
+        else:
+            todo.append((i, patient, item.narrative))
+
+    outcomes = await intake_engine.run_intake_batch([(p, text) for _, p, text in todo])
+    for (i, _, _), outcome in zip(todo, outcomes):
+        if isinstance(outcome, Exception):
+            results[i].error = str(outcome) or type(outcome).__name__
+            continue
+        try:
+            results[i].result = IntakeResponse(**outcome)
+        except ValidationError as e:
+            results[i].error = str(e)
+
+    batch = IntakeBatchResponse(
+        results=results,
+        unique_narratives=len({(p.id, text.strip()) for _, p, text in todo}),
+        failed=sum(1 for r in results if r.error),
+    )
+    return model_response(batch, IntakeBatchResponse)
+
+
+def _lean_slot(a: Appointment) -> AvailableSlot:
+    return AvailableSlot(
+        id=a.id,
+        start=a.start,
+        slot_duration=a.slot_duration,
+        provider_id=a.provider_id,
+        location=a.location,
+        visit_type=a.visit_type,
+    )
+
+
+def _encode_slot_cursor(a: Appointment) -> str:
+    return base64.urlsafe_b64encode(f"{a.start.isoformat()}|{a.id}".encode()).decode()
+
 
-    patient = data_access.find_patient(patients, req.patient_id)
+def _decode_slot_cursor(cursor: str | None) -> Tuple[datetime, int] | None:
+    if not cursor:
+        return None
+    try:
+        start, appointment_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(start), int(appointment_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _slot_window(req: AvailableSlotsRequest) -> Tuple[ClinicalRisk, datetime, datetime]:
+    """Risk for the visit, now, and the end of its recommended booking window."""
+    patient = data_access.get_patient(req.patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    insurance = data_access.find_insurance(insurances, patient.insurance_id)
+    insurance = data_access.get_insurance(patient.insurance_id)
     if not insurance:
         raise HTTPException(status_code=404, detail="Insurance not found")
 
     # 🔹 1) Get LLM risk
-    risk = risk_engine.calculate_risk(
+    risk = await risk_engine.calculate_risk(
         patient=patient,
         insurance=insurance,
         proposed_reason=req.reason_for_visit,
-        existing_appointments=appointments,
+        history=data_access.patient_history(patient.id),
     )
 
-    # 🔹 2) Base set of available slots (by provider + status)
-    now = datetime.utcnow()
-    available = [
-        a
-        for a in appointments
-        if a.status == "available"
-        and a.start >= now
-        and (req.provider_id is None or a.provider_id == req.provider_id)
-    ]
-
-    # 🔹 3) Map risk → urgency window
+    # 🔹 2) Map risk → urgency window
     urgency = risk.recommended_urgency  # "routine" | "within_7_days" | "within_48_hours" | "within_24_hours"
 
     if urgency == "within_24_hours":
@@ -182,78 +282,134 @@ def available_slots(req: AvailableSlotsRequest):
     else:  # "routine"
         max_days = 30  # or whatever upper bound you want
 
-    max_start = now + timedelta(days=max_days)
-
-    # 🔹 4) Split into recommended vs other
-    recommended_appts = [a for a in available if a.start <= max_start]
-    other_appts = [a for a in available if a.start > max_start]
+    now = datetime.utcnow()
+    return risk, now, now + timedelta(days=max_days)
 
-    # Sort chronologically
-    recommended_appts.sort(key=lambda a: a.start)
-    other_appts.sort(key=lambda a: a.start)
 
-    # 🔹 5) Wrap recommended_appts in RecommendedSlot
+@app.post("/appointments/available", response_model=AvailableSlotsResponse)
+async def available_slots(req: AvailableSlotsRequest):
+    after = _decode_slot_cursor(req.cursor)
+    risk, now, max_start = await _slot_window(req)
+
+    # 🔹 3) One page of open slots (by provider), in time order: the ones
+    # inside the window are recommended, the rest follow as other slots
+    with tracing.span("slots.query"):
+        page = list(islice(
+            data_access.iter_available_appointments(
+                provider_id=req.provider_id,
+                start_from=now,
+                after=after,
+                chunk_size=req.limit + 1,
+            ),
+            req.limit + 1,
+        ))
+
+    next_cursor = None
+    if len(page) > req.limit:
+        page = page[:req.limit]
+        next_cursor = _encode_slot_cursor(page[-1])
+
+    # 🔹 4) Wrap recommended slots in RecommendedSlot
     recommended_slots: List[RecommendedSlot] = [
         RecommendedSlot(
-            appointment=a,
+            appointment=_lean_slot(a),
             score_adjustment=0,  # later you can tweak by risk_level / factors
         )
-        for a in recommended_appts
+        for a in page
+        if a.start < max_start
     ]
 
-    return AvailableSlotsResponse(
+    slots = AvailableSlotsResponse(
         risk=risk,
         recommended_slots=recommended_slots,
-        other_slots=other_appts,
+        other_slots=[_lean_slot(a) for a in page if a.start >= max_start],
+        next_cursor=next_cursor,
     )
+    return model_response(slots, AvailableSlotsResponse)
+
+
+# 📜 Every open slot at once (exports, long calendars), as NDJSON
+@app.post("/appointments/available/stream")
+async def stream_available_slots(req: AvailableSlotsRequest):
+    """
+    Same slots as /appointments/available without the page limit: a first
+    line with `risk` and `recommended_until`, then one line per slot (the
+    AvailableSlot fields + `recommended`). Slots are read from the store
+    and written out in batches, so the listing is never held in memory.
+    """
+    after = _decode_slot_cursor(req.cursor)
+    risk, now, max_start = await _slot_window(req)
+    slots = data_access.iter_available_appointments(
+        provider_id=req.provider_id, start_from=now, after=after
+    )
+
+    def lines():
+        header = {"risk": jsonable_encoder(risk), "recommended_until": max_start.isoformat()}
+        yield json.dumps(header) + "\n"
+        while batch := list(islice(slots, 500)):
+            yield "".join(
+                json.dumps({**_lean_slot(a).model_dump(mode="json"), "recommended": a.start < max_start})
+                + "\n"
+                for a in batch
+            )
 
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-@app.post("/appointments/book", response_model=BookingSummary)
-def book_appointment(req: BookAppointmentRequest):
-    patients = data_access.load_patients()
-    insurances = data_access.load_insurances()
-    appointments = data_access.load_appointments()
 
-    patient = data_access.find_patient(patients, req.patient_id)
+@app.post("/appointments/book", response_model=BookingSummary)
+async def book_appointment(req: BookAppointmentRequest):
+    patient = data_access.get_patient(req.patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    appointment = data_access.find_appointment(appointments, req.appointment_id)
+    appointment = data_access.get_appointment(req.appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
     if appointment.status != "available":
         raise HTTPException(status_code=400, detail="Appointment not available")
 
-    insurance = data_access.find_insurance(insurances, patient.insurance_id)
+    insurance = data_access.get_insurance(patient.insurance_id)
     if not insurance:
         raise HTTPException(status_code=404, detail="Insurance not found")
 
+    # Remember which version we saw; the slow LLM call below runs without
+    # holding any lock and we only commit if nobody booked the slot meanwhile.
+    expected_version = appointment.version
+
     # Compute risk and attach to appointment
-    risk = risk_engine.calculate_risk(
+    risk = await risk_engine.calculate_risk(
         patient=patient,
         insurance=insurance,
         proposed_reason=req.reason_for_visit,
-        existing_appointments=appointments,
+        history=data_access.patient_history(patient.id),
     )
 
-    appointment.patient_id = patient.id
-    appointment.status = "booked"
-    appointment.reason_for_visit = req.reason_for_visit
-    appointment.clinical_risk = risk
+    # Cached records are shared across requests -> work on a copy.
+    # The prep summary is generated in the background after we return.
+    appointment = appointment.model_copy(
+        update={
+            "patient_id": patient.id,
+            "status": "booked",
+            "reason_for_visit": req.reason_for_visit,
+            "clinical_risk": risk,
+            "prep_summary": None,
+            "prep_summary_status": "pending",
+        }
+    )
 
-    # Persist appointments for demo purposes
-    
+    try:
+        with tracing.span("book.commit"):
+            # File / SQLite write: keep it off the event loop
+            appointment = await run_in_threadpool(
+                data_access.compare_and_swap_appointment, appointment, expected_version
+            )
+    except data_access.StaleAppointmentError:
+        raise HTTPException(status_code=409, detail="Appointment was just booked by someone else")
 
-    prep_summary = prep_engine.build_prep_summary(
-        appointment=appointment,
-        patient=patient,
-        insurance=insurance,
-        clinical_risk=risk,
-    )
-    appointment.prep_summary = prep_summary
-    data_access.save_appointments(appointments)
+    prep_queue.enqueue(appointment.id)
 
-    return BookingSummary(appointment=appointment, risk=risk, prep_summary=prep_summary)
+    summary = BookingSummary(appointment=appointment, risk=risk, prep_summary=None)
+    return model_response(summary, BookingSummary)
 
 
 @app.get("/clinician/schedule", response_model=List[ClinicianScheduleItem])
@@ -261,23 +417,23 @@ def clinician_schedule(
     provider_id: int,
     date_str: str | None = None,
 ):
-    appointments = data_access.load_appointments()
-    patients = data_access.load_patients()
-
+    start_from = start_to = None
     if date_str:
         target_date = date.fromisoformat(date_str)
-        appointments = [
-            a
-            for a in appointments
-            if a.start.date() == target_date and a.provider_id == provider_id and a.status == "booked"
-        ]
-    else:
-        appointments = [a for a in appointments if a.provider_id == provider_id and a.status == "booked"]
+        start_from = datetime.combine(target_date, time.min)
+        start_to = start_from + timedelta(days=1)
+
+    appointments = data_access.appointments_for_provider(
+        provider_id,
+        status="booked",
+        start_from=start_from,
+        start_to=start_to,
+    )
 
     items: List[ClinicianScheduleItem] = []
 
-    for a in sorted(appointments, key=lambda x: x.start):
-        patient = data_access.find_patient(patients, a.patient_id) if a.patient_id else None
+    for a in appointments:
+        patient = data_access.get_patient(a.patient_id) if a.patient_id else None
         if not patient:
             continue
         age_years = prep_engine._age(patient.dob)
@@ -288,51 +444,76 @@ def clinician_schedule(
                 patient_name=f"{patient.first_name} {patient.last_name}",
                 patient_age=age_years,
                 clinical_risk=a.clinical_risk,
-                prep_summary_status="ready",
+                prep_summary_status=(
+                    "ready"
+                    if a.prep_summary and not prep_engine.is_fallback(a.prep_summary)
+                    else a.prep_summary_status or "not_generated"
+                ),
             )
         )
 
-    return items
-
+    return model_response(items, List[ClinicianScheduleItem])
 
-@app.get("/prep-summary/{appointment_id}")
-def get_prep_summary(appointment_id: int):
-    appointments = data_access.load_appointments()
-    patients = data_access.load_patients()
-    insurances = data_access.load_insurances()
 
-    appointment = data_access.find_appointment(appointments, appointment_id)
+def _check_prep_inputs(appointment_id: int) -> None:
+    appointment = data_access.get_appointment(appointment_id)
     if not appointment:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
     if not appointment.patient_id:
         raise HTTPException(status_code=400, detail="Appointment has no patient")
 
-    patient = data_access.find_patient(patients, appointment.patient_id)
+    patient = data_access.get_patient(appointment.patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    insurance = data_access.find_insurance(insurances, patient.insurance_id)
+    insurance = data_access.get_insurance(patient.insurance_id)
     if not insurance:
         raise HTTPException(status_code=404, detail="Insurance not found")
 
-    # If you already computed risk during booking, use that; otherwise recompute:
-    risk = (
-        appointment.clinical_risk
-        if getattr(appointment, "clinical_risk", None)
-        else risk_engine.calculate_risk(
-            patient=patient,
-            insurance=insurance,
-            proposed_reason=getattr(appointment, "reason_for_visit", "") or "",
-            existing_appointments=appointments,
-        )
-    )
 
-    summary = prep_engine.build_prep_summary(
-        appointment=appointment,
-        patient=patient,
-        insurance=insurance,
-        clinical_risk=risk,
-    )
+@app.get("/prep-summary/{appointment_id}")
+async def get_prep_summary(appointment_id: int, refresh: bool = Query(default=False)):
+    _check_prep_inputs(appointment_id)
+
+    # Serves the stored summary while its inputs are unchanged; rebuilds
+    # (once, however many clinicians ask at the same time) when they change
+    # or on ?refresh=true.
+    summary = await prep_queue.generate(appointment_id, force=refresh)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Appointment not found")
 
     return summary
+
+
+# 📡 Streaming prep summary (Server-Sent Events)
+@app.get("/prep-summary/{appointment_id}/stream")
+async def stream_prep_summary(appointment_id: int, refresh: bool = Query(default=False)):
+    """
+    Same summary as GET /prep-summary/{id}, as an SSE stream: a `sections`
+    event with the rule-based sections right away, `delta` events with the
+    LLM output for todo_for_clinic / note_template as it arrives, then a
+    `summary` event with the complete summary (or an `error` event).
+    """
+    _check_prep_inputs(appointment_id)
+
+    async def events():
+        try:
+            async for event, data in prep_queue.stream(appointment_id, force=refresh):
+                yield f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+        except Exception as e:
+            logger.exception("prep summary stream failed for appointment %s", appointment_id)
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# 📈 Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
@@ -1,6 +1,6 @@
 from typing import List, Optional, Literal, Dict, Any
 from datetime import datetime, date
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class Address(BaseModel):
@@ -58,6 +58,9 @@ class ClinicalRisk(BaseModel):
     generated_at: datetime
 
 
+PrepSummaryStatus = Literal["ready", "pending", "failed", "not_generated"]
+
+
 # 🔹 structured intake we want to persist on the appointment
 class IntakeStructured(BaseModel):
     reason_for_visit: str
@@ -90,12 +93,36 @@ class Appointment(BaseModel):
     intake_narrative: Optional[str] = None
     intake_structured: Optional[IntakeStructured] = None
     prep_summary: Optional[Dict[str, Any]] = None  # what you send to PrepSummaryPanel
+    prep_summary_status: Optional[PrepSummaryStatus] = None  # set while generated in background
+    prep_summary_fingerprint: Optional[str] = None  # inputs the stored prep_summary was built from
     final_note: Optional[Dict[str, Any]] = None    # optional: clinician-edited SOAP
 
+    # 🔹 bumped on every write; used for compare-and-swap when booking
+    version: int = 0
+
     # Ignore any extra keys in JSON instead of erroring
     model_config = ConfigDict(extra="ignore")
 
 
+# 🔹 compact per-patient history the risk engine sees instead of every slot
+class VisitHistoryItem(BaseModel):
+    appointment_id: int
+    start: datetime
+    status: str
+    visit_type: Optional[str] = None
+    reason_for_visit: Optional[str] = None
+    risk_level: Optional[str] = None
+
+
+class PatientHistory(BaseModel):
+    patient_id: int
+    recent_visits: List[VisitHistoryItem] = []  # newest first, capped
+    total_visits: int = 0
+    no_show_count: int = 0
+    cancelled_count: int = 0
+    recent_reasons: List[str] = []
+
+
 class RiskPreviewRequest(BaseModel):
     patient_id: int
     reason_for_visit: str
@@ -115,21 +142,53 @@ class IntakeResponse(IntakeStructured):
     pass
 
 
+class IntakeBatchRequest(BaseModel):
+    items: List[IntakeRequest] = Field(..., min_length=1, max_length=200)
+
+
+class IntakeBatchItem(BaseModel):
+    # Position in the request's `items`
+    index: int
+    patient_id: int
+    result: Optional[IntakeResponse] = None
+    error: Optional[str] = None
+
+
+class IntakeBatchResponse(BaseModel):
+    results: List[IntakeBatchItem]
+    unique_narratives: int
+    failed: int
+
+
 class AvailableSlotsRequest(BaseModel):
     patient_id: int
     reason_for_visit: str
     provider_id: Optional[int] = None
+    # Slots per page (recommended + other); pass back next_cursor for more
+    limit: int = Field(default=100, ge=1, le=500)
+    cursor: Optional[str] = None
+
+
+# 🔹 Lean view of an open slot: just what the scheduler UI shows / books
+class AvailableSlot(BaseModel):
+    id: int
+    start: datetime
+    slot_duration: int
+    provider_id: Optional[int] = None
+    location: Optional[str] = None
+    visit_type: Optional[str] = None
 
 
 class RecommendedSlot(BaseModel):
-    appointment: Appointment
+    appointment: AvailableSlot
     score_adjustment: int
 
 
 class AvailableSlotsResponse(BaseModel):
     risk: ClinicalRisk
     recommended_slots: List[RecommendedSlot]
-    other_slots: List[Appointment]
+    other_slots: List[AvailableSlot]
+    next_cursor: Optional[str] = None  # None on the last page
 
 
 class BookAppointmentRequest(BaseModel):
@@ -141,7 +200,7 @@ class BookAppointmentRequest(BaseModel):
 class BookingSummary(BaseModel):
     appointment: Appointment
     risk: ClinicalRisk
-    prep_summary: Dict[str, Any]
+    prep_summary: Optional[Dict[str, Any]] = None  # None while still being generated
 
 
 class ClinicianScheduleItem(BaseModel):
@@ -150,7 +209,7 @@ class ClinicianScheduleItem(BaseModel):
     patient_name: str
     patient_age: int
     clinical_risk: Optional[ClinicalRisk] = None
-    prep_summary_status: Literal["ready", "not_generated"] = "ready"
+    prep_summary_status: PrepSummaryStatus = "ready"
 
 
 class PatientAppointmentsResponse(BaseModel):
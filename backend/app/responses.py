@@ -0,0 +1,49 @@
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+
+# Handlers build their results out of already-validated models. Returning
+# them as-is makes FastAPI validate them again against `response_model` and
+# run jsonable_encoder + json.dumps on the result. model_response() instead
+# serializes straight to bytes with pydantic-core, once. Routes keep their
+# response_model= for the OpenAPI schema.
+#
+# FAST_JSON_RESPONSES=false goes back to FastAPI's standard path.
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() == "true"
+
+
+@lru_cache(maxsize=None)
+def _adapter(type_: Any) -> TypeAdapter:
+    return TypeAdapter(type_)
+
+
+class ModelJSONResponse(Response):
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        content: Any,
+        type_: Any,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        self.type_ = type_
+        super().__init__(content, status_code=status_code, headers=headers)
+
+    def render(self, content: Any) -> bytes:
+        return _adapter(self.type_).dump_json(content)
+
+
+def model_response(content: Any, type_: Any, headers: Optional[Dict[str, str]] = None) -> Any:
+    """
+    Respond with `content`, already an instance of `type_` (e.g. a model or
+    List[Patient]), serialized exactly as response_model would but without
+    re-validating it. Extra `headers` are only needed on the fast path;
+    callers set them on the injected Response too for the fallback.
+    """
+    if not FAST_JSON_RESPONSES:
+        return content
+    return ModelJSONResponse(content, type_, headers=headers)
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+from pydantic import BaseModel
+
+V = TypeVar("V")
+
+
+def fingerprint(*parts: Any) -> str:
+    """
+    Stable hash of the given inputs (models, dicts, strings...).
+
+    Any change to any input gives a different fingerprint, so caches keyed on
+    it never serve a result computed from stale inputs.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, BaseModel):
+            data = part.model_dump_json().encode()
+        else:
+            data = json.dumps(part, sort_keys=True, default=str).encode()
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class TTLCache(Generic[V]):
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight(Generic[V]):
+    """
+    Coalesces concurrent async calls: while a call for `key` is in flight,
+    further callers with the same key await that call instead of starting
+    their own. Nothing is kept once it finishes (pair with TTLCache for that).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, "asyncio.Future[V]"] = {}
+        self.shared = 0
+
+    def get(self, key: Hashable) -> "Optional[asyncio.Future[V]]":
+        return self._inflight.get(key)
+
+    def start(self, key: Hashable, fn: Callable[[], Awaitable[V]]) -> "asyncio.Future[V]":
+        """The in-flight call for `key`, starting `fn()` if there is none."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.shared += 1
+        return task
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[V]]) -> V:
+        # shield: one caller going away must not cancel the call for the others
+        return await asyncio.shield(self.start(key, fn))
+
+    def _forget(self, key: Hashable, task: "asyncio.Future[V]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
@@ -1,43 +1,649 @@
+import gc
 import json
+import logging
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Type
 
-from . import risk_engine  # noqa: F401 (used indirectly)
-from ..models import Patient, Appointment, Insurance
+from pydantic import BaseModel, TypeAdapter
+
+from . import metrics, risk_engine, tracing
+from .journal import Journal
+from .patient_search import PatientIndex
+from ..models import Patient, Appointment, Insurance, PatientHistory
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parents[2]
-DATA_DIR = BASE_DIR / "data"
+DATA_DIR = Path(os.getenv("DATA_DIR", str(BASE_DIR / "data")))
+
+PATIENTS_FILE = "patients.json"
+INSURANCES_FILE = "insurances.json"
+APPOINTMENTS_FILE = "appointments.json"
+APPOINTMENTS_JOURNAL = "appointments.journal.jsonl"
+
+# Booking journal tuning (see journal.Journal)
+_JOURNAL_FSYNC_EVERY = int(os.getenv("JOURNAL_FSYNC_EVERY", "16"))
+_JOURNAL_FSYNC_INTERVAL_MS = int(os.getenv("JOURNAL_FSYNC_INTERVAL_MS", "50"))
+_JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", "500"))
 
+# Default slots fetched per step by iter_available_appointments
+_SLOT_CHUNK = 500
 
-def _load_json(filename: str) -> List[Dict]:
+def _read_bytes(filename: str) -> bytes:
+    with metrics.storage_io_duration.time(op="load", file=filename), tracing.span("storage.load"):
+        return (DATA_DIR / filename).read_bytes()
+
+
+def _write_tmp_json(filename: str, data: List[Dict]) -> Path:
+    """Write `data` to a synced temp file next to `filename` and return its path."""
     path = DATA_DIR / filename
-    with path.open() as f:
-        return json.load(f)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with metrics.storage_io_duration.time(op="save", file=filename), tracing.span("storage.save"):
+        with tmp_path.open("w") as f:
+            json.dump(data, f, indent=2, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+    return tmp_path
 
 
 def _save_json(filename: str, data: List[Dict]) -> None:
-    path = DATA_DIR / filename
-    with path.open("w") as f:
-        json.dump(data, f, indent=2, default=str)
+    """
+    Write via a temp file + rename so a crash mid-write never leaves a
+    half-written JSON file behind.
+    """
+    os.replace(_write_tmp_json(filename, data), DATA_DIR / filename)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+@contextmanager
+def _gc_paused():
+    """
+    Bulk loads allocate hundreds of thousands of long-lived objects; left on,
+    the cyclic GC keeps rescanning them mid-load for nothing to collect.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# ---------------------------------------------------------------------------
+# Process-wide resident store
+# ---------------------------------------------------------------------------
+#
+# Each JSON file is parsed and validated once, then kept in memory. A file is
+# only re-read when its (mtime, size) changes on disk, e.g. when someone edits
+# data/*.json by hand while the API is running.
+#
+# Bookings are not written back to appointments.json directly. Each one is
+# appended as a single compact line to appointments.journal.jsonl, which is
+# replayed on top of the snapshot at load time and folded back into it by a
+# background thread every _JOURNAL_COMPACT_EVERY records (and on shutdown).
+#
+# Records handed out by the loaders are shared between requests, so treat them
+# as read-only: writers replace a record (model_copy + save_appointment)
+# instead of mutating it in place. Readers that grabbed a list earlier keep a
+# consistent view for the rest of their request.
+
+_StatKey = Tuple[int, ...]
+
+
+class _Table:
+    """
+    Cached contents of one JSON file, indexed by record id.
+
+    `by_id` keeps file order (dicts are insertion-ordered), so `records()`
+    returns rows in the same order as the file.
+    """
+
+    def __init__(self, filename: str, model: Type[BaseModel]):
+        self.filename = filename
+        self.model = model
+        self.stat_key: Optional[_StatKey] = None
+        self.by_id: Dict[int, BaseModel] = {}
+
+    def files(self) -> List[str]:
+        """Files whose (mtime, size) decide whether the cache is stale."""
+        return [self.filename]
+
+    def load(self) -> None:
+        raw = _read_bytes(self.filename)
+        with _gc_paused():
+            with metrics.storage_validate_duration.time(file=self.filename), tracing.span("storage.validate"):
+                records = _list_adapter(self.model).validate_json(raw)
+            self.rebuild(records)
+
+    def records(self) -> List[BaseModel]:
+        return list(self.by_id.values())
+
+    def rebuild(self, records: List[BaseModel]) -> None:
+        self.by_id = {r.id: r for r in records}
+
+    def replace(self, record: BaseModel) -> None:
+        self.by_id[record.id] = record
+
+
+class _PatientTable(_Table):
+    """Patients plus the name / email / phone search index behind GET /patients."""
+
+    def __init__(self, filename: str):
+        super().__init__(filename, Patient)
+        self.search = PatientIndex()
+
+    def rebuild(self, records: List[BaseModel]) -> None:
+        super().rebuild(records)
+        self.search.rebuild(records)
+
+    def replace(self, record: BaseModel) -> None:
+        super().replace(record)
+        self.search.add(record)
+
+
+class _SlotIndex:
+    """
+    Open slots kept sorted by (start, id), so a time window is two bisects
+    plus a slice: O(log n + k) instead of a full scan + sort.
+    """
+
+    def __init__(self, slots: Iterable[Appointment] = ()):
+        self.by_id: Dict[int, Appointment] = {a.id: a for a in slots}
+        # Bulk load: one sort instead of an insort per slot
+        self.keys: List[Tuple[datetime, int]] = sorted((a.start, a.id) for a in self.by_id.values())
+
+    def add(self, a: Appointment) -> None:
+        insort(self.keys, (a.start, a.id))
+        self.by_id[a.id] = a
+
+    def remove(self, a: Appointment) -> None:
+        i = bisect_left(self.keys, (a.start, a.id))
+        if i < len(self.keys) and self.keys[i] == (a.start, a.id):
+            del self.keys[i]
+        self.by_id.pop(a.id, None)
+
+    def range(self, start_from: Optional[datetime], start_to: Optional[datetime]) -> List[Appointment]:
+        # A 1-tuple sorts before every (start, id) with the same start
+        lo = bisect_left(self.keys, (start_from,)) if start_from is not None else 0
+        hi = bisect_left(self.keys, (start_to,)) if start_to is not None else len(self.keys)
+        return [self.by_id[i] for _, i in self.keys[lo:hi]]
+
+    def page(
+        self,
+        after: Optional[Tuple[datetime, int]],
+        start_from: Optional[datetime],
+        start_to: Optional[datetime],
+        limit: int,
+    ) -> List[Appointment]:
+        """Up to `limit` slots in the window that sort after the (start, id) key `after`."""
+        lo = bisect_left(self.keys, (start_from,)) if start_from is not None else 0
+        if after is not None:
+            lo = max(lo, bisect_right(self.keys, after))
+        hi = bisect_left(self.keys, (start_to,)) if start_to is not None else len(self.keys)
+        return [self.by_id[i] for _, i in self.keys[lo:min(hi, lo + limit)]]
+
+
+class _AppointmentTable(_Table):
+    """
+    Appointments additionally keep secondary indexes so per-patient and
+    per-provider lookups don't have to scan every slot, plus time-ordered
+    indexes of open slots (per provider, and clinic-wide under key None).
+    """
+
+    def __init__(self, filename: str):
+        super().__init__(filename, Appointment)
+        self.by_patient: Dict[int, Dict[int, Appointment]] = {}
+        self.by_provider: Dict[int, Dict[int, Appointment]] = {}
+        self.open_slots: Dict[Optional[int], _SlotIndex] = {None: _SlotIndex()}
+        # patient_id -> precomputed risk-prompt history, dropped on change
+        self.history: Dict[int, PatientHistory] = {}
+
+    def files(self) -> List[str]:
+        return [self.filename, APPOINTMENTS_JOURNAL]
+
+    def load(self) -> None:
+        super().load()
+        # Replay bookings made since the last compaction
+        journal = _get_journal()
+        replayed = 0
+        for entry in journal.replay():
+            self.replace(Appointment.model_validate(entry["appointment"]))
+            replayed += 1
+        journal.records_since_compaction = replayed
+
+    def rebuild(self, records: List[BaseModel]) -> None:
+        super().rebuild(records)
+        self.by_patient = {}
+        self.by_provider = {}
+        self.history = {}
+        open_slots: Dict[Optional[int], List[Appointment]] = {None: []}
+        for a in self.by_id.values():
+            self._index_owners(a)
+            if a.status == "available":
+                open_slots[None].append(a)
+                if a.provider_id is not None:
+                    open_slots.setdefault(a.provider_id, []).append(a)
+        self.open_slots = {key: _SlotIndex(slots) for key, slots in open_slots.items()}
+
+    def replace(self, record: BaseModel) -> None:
+        old = self.by_id.get(record.id)
+        if old is not None:
+            self._unindex(old)
+        super().replace(record)
+        self._index(record)
+
+    def _index(self, a: Appointment) -> None:
+        self._index_owners(a)
+        if a.status == "available":
+            self.open_slots[None].add(a)
+            if a.provider_id is not None:
+                self.open_slots.setdefault(a.provider_id, _SlotIndex()).add(a)
+
+    def _index_owners(self, a: Appointment) -> None:
+        if a.patient_id is not None:
+            self.by_patient.setdefault(a.patient_id, {})[a.id] = a
+            self.history.pop(a.patient_id, None)
+        if a.provider_id is not None:
+            self.by_provider.setdefault(a.provider_id, {})[a.id] = a
+
+    def _unindex(self, a: Appointment) -> None:
+        if a.patient_id is not None:
+            self.by_patient.get(a.patient_id, {}).pop(a.id, None)
+            self.history.pop(a.patient_id, None)
+        if a.provider_id is not None:
+            self.by_provider.get(a.provider_id, {}).pop(a.id, None)
+        if a.status == "available":
+            self.open_slots[None].remove(a)
+            if a.provider_id in self.open_slots:
+                self.open_slots[a.provider_id].remove(a)
+
+
+_tables: Dict[str, _Table] = {
+    PATIENTS_FILE: _PatientTable(PATIENTS_FILE),
+    INSURANCES_FILE: _Table(INSURANCES_FILE, Insurance),
+    APPOINTMENTS_FILE: _AppointmentTable(APPOINTMENTS_FILE),
+}
+
+_lock = threading.RLock()
+
+_journal: Optional[Journal] = None
+
+# Held for a whole compaction / snapshot write (always taken before _lock)
+_compact_lock = threading.Lock()
+_compaction: Optional[threading.Thread] = None
+
+
+def _get_journal() -> Journal:
+    global _journal
+    path = DATA_DIR / APPOINTMENTS_JOURNAL
+    if _journal is None or _journal.path != path:
+        if _journal is not None:
+            _journal.close()
+        _journal = Journal(
+            path,
+            fsync_every=_JOURNAL_FSYNC_EVERY,
+            fsync_interval=_JOURNAL_FSYNC_INTERVAL_MS / 1000,
+        )
+    return _journal
+
+
+def _stat_key(table: _Table) -> _StatKey:
+    key: Tuple[int, ...] = ()
+    for filename in table.files():
+        try:
+            st = (DATA_DIR / filename).stat()
+            key += (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            key += (0, 0)
+    return key
+
+
+def _get_table(filename: str) -> _Table:
+    """
+    Return the cached table for a file, re-reading it only if it changed
+    on disk since the last load.
+    """
+    table = _tables[filename]
+    if table.stat_key == _stat_key(table):
+        return table
+
+    with _lock:
+        # Another thread may have refreshed it while we waited for the lock
+        key = _stat_key(table)
+        if table.stat_key != key:
+            table.load()
+            table.stat_key = key
+        return table
+
+
+def warm_cache() -> None:
+    """Load every data file up front (called once at app startup)."""
+    for filename in _tables:
+        _get_table(filename)
+
+
+def invalidate_cache() -> None:
+    """Drop all cached data so the next access re-reads from disk."""
+    with _lock:
+        for table in _tables.values():
+            table.stat_key = None
+            table.rebuild([])
 
 
 def load_patients() -> List[Patient]:
-    raw = _load_json("patients.json")
-    return [Patient.model_validate(p) for p in raw]
+    with _lock:
+        return _get_table(PATIENTS_FILE).records()
 
 
 def load_insurances() -> List[Insurance]:
-    raw = _load_json("insurances.json")
-    return [Insurance.model_validate(i) for i in raw]
+    with _lock:
+        return _get_table(INSURANCES_FILE).records()
 
 
 def load_appointments() -> List[Appointment]:
-    raw = _load_json("appointments.json")
-    return [Appointment.model_validate(a) for a in raw]
+    with _lock:
+        return _get_table(APPOINTMENTS_FILE).records()
 
 
 def save_appointments(appointments: List[Appointment]) -> None:
-    _save_json("appointments.json", [a.model_dump() for a in appointments])
+    """Replace the whole appointment list (writes a fresh snapshot)."""
+    # _compact_lock first: a compaction in flight must not publish its
+    # older snapshot over this one
+    with _compact_lock, _lock:
+        appointments = list(appointments)
+        _save_json(APPOINTMENTS_FILE, [a.model_dump() for a in appointments])
+        _get_journal().truncate()
+        # We just wrote these records ourselves; no need to parse them back
+        table = _tables[APPOINTMENTS_FILE]
+        table.rebuild(appointments)
+        table.stat_key = _stat_key(table)
+
+
+def save_patient(patient: Patient) -> None:
+    """
+    Persist a new or edited patient. Rewrites patients.json (there is no
+    patient journal) but only re-indexes this one record for search.
+    """
+    with _lock:
+        table = _get_table(PATIENTS_FILE)
+        table.replace(patient)
+        _save_json(PATIENTS_FILE, [p.model_dump(mode="json") for p in table.records()])
+        table.stat_key = _stat_key(table)
+
+
+def save_appointment(appointment: Appointment) -> None:
+    """
+    Persist a single (new or updated) appointment.
+
+    Appends one journal record and patches the in-memory indexes, so the
+    cost doesn't depend on how many appointments exist.
+    """
+    with _lock, tracing.span("storage.journal"):
+        table = _get_table(APPOINTMENTS_FILE)
+        journal = _get_journal()
+        journal.append({"op": "upsert", "appointment": appointment.model_dump(mode="json")})
+        table.replace(appointment)
+        table.stat_key = _stat_key(table)
+
+        if journal.records_since_compaction >= _JOURNAL_COMPACT_EVERY:
+            _compact_in_background()
+
+
+class StaleAppointmentError(Exception):
+    """The appointment changed since the caller read it (lost the CAS race)."""
+
+
+# Striped per-slot locks: a fixed pool picked by id, so memory doesn't grow
+# with the appointment table. Two slots sharing a stripe only wait on each
+# other's (short) commit; no code path holds more than one of them.
+_SLOT_LOCK_STRIPES = 256
+_slot_locks = [threading.Lock() for _ in range(_SLOT_LOCK_STRIPES)]
+
+
+def _slot_lock(appointment_id: int) -> threading.Lock:
+    return _slot_locks[appointment_id % _SLOT_LOCK_STRIPES]
+
+
+def compare_and_swap_appointment(appointment: Appointment, expected_version: int) -> Appointment:
+    """
+    Save `appointment` only if the stored copy is still at `expected_version`.
+
+    Callers read the slot, do their slow work (LLM calls) without holding any
+    lock, then commit here. Only writers to the *same* slot serialize on its
+    lock; the check + write is all that happens inside it. Returns the saved
+    record (with its bumped version) or raises StaleAppointmentError.
+    """
+    with _slot_lock(appointment.id):
+        current = get_appointment(appointment.id)
+        if current is None or current.version != expected_version:
+            raise StaleAppointmentError(appointment.id)
+        saved = appointment.model_copy(update={"version": expected_version + 1})
+        save_appointment(saved)
+        return saved
+
+
+def compare_and_swap_many(
+    items: List[Tuple[Appointment, int]],
+) -> Tuple[List[Appointment], List[int]]:
+    """
+    Bulk compare_and_swap_appointment for batch jobs: same per-slot checks,
+    but the journal is synced once at the end instead of per batch.
+    Returns (saved records, ids that lost a race).
+    """
+    saved: List[Appointment] = []
+    conflicts: List[int] = []
+    for appointment, expected_version in items:
+        try:
+            saved.append(compare_and_swap_appointment(appointment, expected_version))
+        except StaleAppointmentError:
+            conflicts.append(appointment.id)
+    _get_journal().sync()
+    return saved, conflicts
+
+
+def compact_appointments() -> None:
+    """
+    Fold the booking journal back into appointments.json.
+
+    Only taking the snapshot and swapping files in happen under the global
+    lock; serializing and writing the snapshot (the slow part) doesn't, so
+    bookings keep landing in the journal meanwhile. Those stay in the
+    journal: only the records the snapshot covers are dropped from it.
+    """
+    with _compact_lock:
+        with _lock:
+            table = _get_table(APPOINTMENTS_FILE)
+            journal = _get_journal()
+            if not journal.records_since_compaction:
+                return
+            records = table.records()
+            upto = journal.mark()
+
+        tmp_path = _write_tmp_json(APPOINTMENTS_FILE, [a.model_dump() for a in records])
+
+        with _lock:
+            # Snapshot first, then drop: if we crash in between, replaying
+            # the (idempotent) upserts on top of the new snapshot is harmless.
+            os.replace(tmp_path, DATA_DIR / APPOINTMENTS_FILE)
+            journal.drop_through(upto)
+            table.stat_key = _stat_key(table)
+
+
+def _run_compaction() -> None:
+    try:
+        compact_appointments()
+    except Exception:
+        logger.exception("journal compaction failed")
+
+
+def _compact_in_background() -> None:
+    """Start a compaction thread unless one is already running (call under _lock)."""
+    global _compaction
+    if _compaction is not None and _compaction.is_alive():
+        return
+    _compaction = threading.Thread(target=_run_compaction, name="journal-compaction", daemon=True)
+    _compaction.start()
+
+
+def close() -> None:
+    """Flush pending journal writes and compact (called on app shutdown)."""
+    compact_appointments()
+    with _lock:
+        if _journal is not None:
+            _journal.close()
+
+
+# ---------------------------------------------------------------------------
+# Indexed lookups
+# ---------------------------------------------------------------------------
+#
+# O(1) by id, plus patient -> appointments and provider -> appointments.
+# Prefer these over load_*() + find_*(), which scan the whole list.
+
+
+def get_patient(patient_id: int) -> Optional[Patient]:
+    return _get_table(PATIENTS_FILE).by_id.get(patient_id)
+
+
+def get_insurance(insurance_id: int) -> Optional[Insurance]:
+    return _get_table(INSURANCES_FILE).by_id.get(insurance_id)
+
+
+def get_appointment(appointment_id: int) -> Optional[Appointment]:
+    return _get_table(APPOINTMENTS_FILE).by_id.get(appointment_id)
+
+
+def search_patients(
+    query: Optional[str], limit: int = 50, cursor: Optional[str] = None
+) -> Tuple[List[Patient], Optional[str]]:
+    """
+    Ranked name / email / phone search (see patient_search.py). Returns one
+    page and the cursor for the next one. Raises ValueError on a bad cursor.
+    """
+    with tracing.span("patients.search"):
+        return _get_table(PATIENTS_FILE).search.search(query, limit, cursor)
+
+
+def _filter_appointments(
+    appointments,
+    status: Optional[str] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+) -> List[Appointment]:
+    """Apply the common status / [start_from, start_to) filters, ordered by start."""
+    return sorted(
+        (
+            a
+            for a in appointments
+            if (status is None or a.status == status)
+            and (start_from is None or a.start >= start_from)
+            and (start_to is None or a.start < start_to)
+        ),
+        key=lambda a: a.start,
+    )
+
+
+def appointments_for_patient(patient_id: int, status: Optional[str] = None) -> List[Appointment]:
+    with _lock:
+        table = _get_table(APPOINTMENTS_FILE)
+        rows = list(table.by_patient.get(patient_id, {}).values())
+    return _filter_appointments(rows, status=status)
+
+
+def appointments_for_provider(
+    provider_id: int,
+    status: Optional[str] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+) -> List[Appointment]:
+    with _lock:
+        table = _get_table(APPOINTMENTS_FILE)
+        rows = list(table.by_provider.get(provider_id, {}).values())
+    return _filter_appointments(rows, status=status, start_from=start_from, start_to=start_to)
+
+
+def patient_history(patient_id: int) -> PatientHistory:
+    """
+    Compact visit history for risk scoring. Built from the per-patient index
+    on first use and cached until one of the patient's appointments changes.
+    """
+    with _lock:
+        table = _get_table(APPOINTMENTS_FILE)
+        history = table.history.get(patient_id)
+        if history is None:
+            rows = list(table.by_patient.get(patient_id, {}).values())
+            history = risk_engine.build_patient_history(patient_id, rows)
+            table.history[patient_id] = history
+        return history
+
+
+def appointments_by_status(
+    status: str,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+) -> List[Appointment]:
+    """All appointments with `status` in [start_from, start_to), by start."""
+    return _filter_appointments(
+        load_appointments(), status=status, start_from=start_from, start_to=start_to
+    )
+
+
+def appointments_pending_prep() -> List[Appointment]:
+    """Booked appointments whose prep summary is still "pending"."""
+    with _lock:
+        table = _get_table(APPOINTMENTS_FILE)
+        return [
+            a for a in table.by_id.values()
+            if a.status == "booked" and a.prep_summary_status == "pending"
+        ]
+
+
+def available_appointments(
+    provider_id: Optional[int] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+) -> List[Appointment]:
+    """Open slots (optionally for one provider) in [start_from, start_to), by start."""
+    with _lock:
+        table = _get_table(APPOINTMENTS_FILE)
+        index = table.open_slots.get(provider_id)
+        return index.range(start_from, start_to) if index is not None else []
+
+
+def iter_available_appointments(
+    provider_id: Optional[int] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    chunk_size: int = _SLOT_CHUNK,
+) -> Iterator[Appointment]:
+    """
+    Lazily walk open slots by (start, id), starting after the key `after`.
+
+    Slots are fetched `chunk_size` at a time, each chunk under the lock and
+    keyed off the last slot seen, so a long listing never holds the lock or
+    copies the whole index, and bookings made meanwhile can't make it skip
+    or repeat a slot.
+    """
+    while True:
+        with _lock:
+            index = _get_table(APPOINTMENTS_FILE).open_slots.get(provider_id)
+            chunk = index.page(after, start_from, start_to, chunk_size) if index is not None else []
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        after = (chunk[-1].start, chunk[-1].id)
 
 
 def find_patient(patients: List[Patient], patient_id: int) -> Optional[Patient]:
@@ -50,3 +656,41 @@ def find_insurance(insurances: List[Insurance], insurance_id: int) -> Optional[I
 
 def find_appointment(appointments: List[Appointment], appointment_id: int) -> Optional[Appointment]:
     return next((a for a in appointments if a.id == appointment_id), None)
+
+
+# ---------------------------------------------------------------------------
+# Storage backend selection
+# ---------------------------------------------------------------------------
+#
+# STORAGE_BACKEND=sqlite swaps everything above for the same surface backed by
+# SQLite (see sqlite_store.py; migrate with `python -m app.tools.import_json_to_sqlite`).
+# The find_*() helpers and StaleAppointmentError are shared by both backends.
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+
+if STORAGE_BACKEND == "sqlite":
+    from .sqlite_store import (  # noqa: E402,F811
+        warm_cache,
+        invalidate_cache,
+        close,
+        load_patients,
+        load_insurances,
+        load_appointments,
+        save_patient,
+        save_appointments,
+        save_appointment,
+        compare_and_swap_appointment,
+        compare_and_swap_many,
+        compact_appointments,
+        get_patient,
+        get_insurance,
+        get_appointment,
+        search_patients,
+        appointments_for_patient,
+        appointments_for_provider,
+        appointments_by_status,
+        appointments_pending_prep,
+        available_appointments,
+        iter_available_appointments,
+        patient_history,
+    )
@@ -1,38 +1,25 @@
 # app/services/intake_engine.py
 
-import os
+import asyncio
 import json
-from typing import Optional, List, Dict
-
-from dotenv import load_dotenv
-from openai import OpenAI
+import os
+from typing import Dict, List, Tuple, Union
 
+from . import llm_client, metrics, tracing
+from .cache import SingleFlight, fingerprint
 from ..models import Patient
 
-load_dotenv()
-
-_OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-_OPENAI_ENABLED = os.getenv("OPENAI_ENABLED", "true").lower() == "true"
-
-_client: Optional[OpenAI] = None
-
-
-def _get_client() -> Optional[OpenAI]:
-    global _client
+# Max LLM calls in flight for one /intake/structure/batch request
+_BATCH_CONCURRENCY = int(os.getenv("INTAKE_BATCH_CONCURRENCY", "8"))
 
-    if not _OPENAI_ENABLED:
-        return None
+_flights: SingleFlight[Dict] = SingleFlight()
 
-    if _client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return None
-        _client = OpenAI(api_key=api_key)
 
-    return _client
+class IntakeError(Exception):
+    """The LLM failed or gave an unusable answer (strict mode only)."""
 
 
-def run_intake(patient: Patient, free_text: str) -> Dict:
+async def run_intake(patient: Patient, free_text: str, strict: bool = False) -> Dict:
     """
     Takes a raw intake narrative (what the patient told front-desk / MA)
     and turns it into structured data:
@@ -40,11 +27,24 @@ def run_intake(patient: Patient, free_text: str) -> Dict:
       - triage_tags
       - suggested_urgency
       - summary
+
+    Identical concurrent requests (same patient + narrative) share one call.
+    By default an LLM error or unparseable reply comes back as a minimal
+    structure tagged "llm_error" / "parse_error"; with `strict` it raises
+    IntakeError instead.
     """
-    client = _get_client()
+    key = (fingerprint(patient, free_text), strict)
+    with tracing.span("intake.structure"):
+        result = await _flights.do(key, lambda: _structure(patient, free_text, strict))
+    return dict(result)
+
+
+async def _structure(patient: Patient, free_text: str, strict: bool = False) -> Dict:
+    client = llm_client.get_client()
 
     # If no LLM configured, just echo back a minimal structure
     if client is None:
+        metrics.llm_fallbacks.inc(engine="intake", reason="unavailable")
         return {
             "reason_for_visit": free_text[:200],
             "triage_tags": ["llm_unavailable"],
@@ -77,21 +77,39 @@ def run_intake(patient: Patient, free_text: str) -> Dict:
         f"{json.dumps(payload, default=str)}"
     )
 
-    chat = client.chat.completions.create(
-        model=_OPENAI_MODEL,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        max_tokens=400,
-    )
+    try:
+        chat = await llm_client.chat(
+            "intake",
+            model=llm_client.OPENAI_MODEL,
+            response_format={"type": "json_object"},
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            max_tokens=400,
+        )
+    except llm_client.LLMUnavailableError as e:
+        if strict:
+            raise IntakeError(f"LLM unavailable: {e}") from e
+        # Timeout / API errors / breaker open -> same minimal structure
+        metrics.llm_fallbacks.inc(engine="intake", reason="error")
+        return {
+            "reason_for_visit": free_text[:200],
+            "triage_tags": ["llm_error"],
+            "suggested_urgency": "routine",
+            "summary": free_text,
+        }
 
     raw_text = chat.choices[0].message.content or ""
 
     try:
         parsed = json.loads(raw_text)
-    except Exception:
+        if not isinstance(parsed, dict):
+            raise ValueError("not a JSON object")
+    except Exception as e:
+        if strict:
+            raise IntakeError(f"Unparseable LLM reply: {e}") from e
+        metrics.llm_fallbacks.inc(engine="intake", reason="parse_error")
         return {
             "reason_for_visit": free_text[:200],
             "triage_tags": ["parse_error"],
@@ -113,3 +131,34 @@ def run_intake(patient: Patient, free_text: str) -> Dict:
         "suggested_urgency": str(suggested_urgency),
         "summary": str(summary),
     }
+
+
+async def run_intake_batch(
+    items: List[Tuple[Patient, str]],
+) -> List[Union[Dict, Exception]]:
+    """
+    run_intake for many (patient, narrative) pairs at once.
+
+    Identical narratives for the same patient are structured once, and at
+    most INTAKE_BATCH_CONCURRENCY calls run at a time. Returns one entry per
+    input, in order: the structured dict, or the exception that item raised
+    (LLM failures included, see run_intake's `strict`).
+    """
+    sem = asyncio.Semaphore(max(1, _BATCH_CONCURRENCY))
+
+    async def one(patient: Patient, free_text: str) -> Dict:
+        async with sem:
+            return await run_intake(patient=patient, free_text=free_text, strict=True)
+
+    # Keyed per patient too: the patient context is part of the prompt
+    unique: Dict[Tuple[int, str], Tuple[Patient, str]] = {}
+    for patient, free_text in items:
+        unique.setdefault((patient.id, free_text.strip()), (patient, free_text))
+
+    results = await asyncio.gather(
+        *(one(patient, free_text) for patient, free_text in unique.values()),
+        return_exceptions=True,
+    )
+    by_key = dict(zip(unique, results))
+    return [by_key[(patient.id, free_text.strip())] for patient, free_text in items]
+
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+
+class Journal:
+    """
+    Append-only JSON-lines write-ahead log.
+
+    Each `append` writes one compact line and flushes it to the OS. fsync is
+    batched: we sync once `fsync_every` records are pending, or at most
+    `fsync_interval` seconds after the first unsynced write, whichever comes
+    first. `fsync_every=1` gives fully synchronous durability.
+    """
+
+    def __init__(self, path: Path, fsync_every: int = 16, fsync_interval: float = 0.05):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._pending = 0
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+        self.records_since_compaction = 0
+
+    def _open(self):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("a", encoding="utf-8")
+            # Terminate a torn last line so new records start cleanly
+            if self.path.stat().st_size and not self._ends_with_newline():
+                self._file.write("\n")
+        return self._file
+
+    def _ends_with_newline(self) -> bool:
+        with self.path.open("rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def append(self, record: Dict) -> None:
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            f = self._open()
+            f.write(line + "\n")
+            f.flush()
+            self._pending += 1
+            self.records_since_compaction += 1
+
+            if self._pending >= self.fsync_every:
+                self._sync_locked()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.fsync_interval, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _sync_locked(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._file is not None and self._pending:
+            os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def sync(self) -> None:
+        """Force any batched records to disk."""
+        with self._lock:
+            self._sync_locked()
+
+    def replay(self) -> Iterator[Dict]:
+        """
+        Yield every record in the journal, in write order.
+
+        A torn line (crash mid-append) is skipped; records around it are
+        still valid since appends after a restart start on a fresh line.
+        """
+        if not self.path.exists():
+            return
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def count(self) -> int:
+        return sum(1 for _ in self.replay())
+
+    def truncate(self) -> None:
+        """Drop all records (after they've been folded into a snapshot)."""
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            with self.path.open("w", encoding="utf-8") as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self.records_since_compaction = 0
+
+    def mark(self) -> int:
+        """Current end of the journal (a byte offset), for drop_through()."""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            return self.path.stat().st_size if self.path.exists() else 0
+
+    def drop_through(self, offset: int) -> None:
+        """
+        Drop the records before `offset` (from mark()) once they've been
+        folded into a snapshot, keeping anything appended since.
+        """
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if not self.path.exists():
+                return
+            with self.path.open("rb") as f:
+                f.seek(offset)
+                tail = f.read()
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with tmp_path.open("wb") as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.records_since_compaction = tail.count(b"\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
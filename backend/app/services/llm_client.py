@@ -0,0 +1,271 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import httpx
+import openai
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from . import metrics, tracing
+
+load_dotenv()
+
+# Env config (shared by risk_engine, prep_engine and intake_engine)
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+_OPENAI_ENABLED = os.getenv("OPENAI_ENABLED", "true").lower() == "true"
+
+# Connection pool for the single shared client. Keep-alive connections are
+# reused across requests, so most LLM calls skip the TCP + TLS handshake.
+_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "50"))
+_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "30"))
+
+# Gateway: every engine calls the LLM through chat() / chat_stream() below.
+# LLM_TIMEOUT_SECONDS bounds one attempt (or the gap between two streamed
+# chunks); LLM_DEADLINE_SECONDS bounds the whole call, including waiting
+# for a concurrency slot and retries.
+_TIMEOUT = float(os.getenv("LLM_TIMEOUT_SECONDS", "15"))
+_DEADLINE = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.5"))
+
+# After LLM_BREAKER_FAILURES consecutive failed calls, fail fast for
+# LLM_BREAKER_COOLDOWN_SECONDS, then let one trial call through.
+_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Max calls in flight per engine, so a burst of one kind of work (e.g. a
+# batch intake import) can't use up every connection.
+_ENGINE_CONCURRENCY = {
+    "risk": int(os.getenv("LLM_CONCURRENCY_RISK", "32")),
+    "prep": int(os.getenv("LLM_CONCURRENCY_PREP", "16")),
+    "intake": int(os.getenv("LLM_CONCURRENCY_INTAKE", "16")),
+}
+
+# Worth another attempt: the provider is slow, overloaded or unreachable
+_RETRYABLE = (
+    asyncio.TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+_client: Optional[AsyncOpenAI] = None
+
+
+class LLMUnavailableError(Exception):
+    """The LLM didn't answer (timeout, API error, breaker open...)."""
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int, cooldown: float):
+        self.threshold = max(1, failures)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.threshold
+
+    def allow(self) -> bool:
+        if not self.is_open:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.cooldown:
+            # Half-open: one trial call per cooldown window
+            self.opened_at = now
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures == self.threshold:
+            self.opened_at = time.monotonic()
+
+
+breaker = CircuitBreaker(_BREAKER_FAILURES, _BREAKER_COOLDOWN)
+
+
+def _record_failure(e: BaseException) -> None:
+    # Only the provider being slow, unreachable or overloaded counts towards
+    # the shared breaker; a rejected request (bad prompt, auth, context
+    # length) says nothing about the other engines' calls
+    if isinstance(e, _RETRYABLE):
+        breaker.record_failure()
+
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def _semaphore(engine: str) -> asyncio.Semaphore:
+    sem = _semaphores.get(engine)
+    if sem is None:
+        sem = _semaphores[engine] = asyncio.Semaphore(max(1, _ENGINE_CONCURRENCY.get(engine, 16)))
+    return sem
+
+
+def get_client() -> Optional[AsyncOpenAI]:
+    """
+    Lazy-init the process-wide AsyncOpenAI client.
+    Does NOT crash the app if the key is missing or OpenAI is disabled.
+    """
+    global _client
+
+    if not _OPENAI_ENABLED:
+        return None
+
+    if _client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            return None
+
+        _client = AsyncOpenAI(
+            api_key=api_key,
+            # Timeouts and retries are handled by chat() / chat_stream()
+            timeout=_TIMEOUT,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=_MAX_CONNECTIONS,
+                    max_keepalive_connections=_MAX_KEEPALIVE,
+                    keepalive_expiry=_KEEPALIVE_EXPIRY,
+                ),
+            ),
+        )
+
+    return _client
+
+
+def _checked_client(engine: str, model: str) -> AsyncOpenAI:
+    client = get_client()
+    if client is None:
+        raise LLMUnavailableError("LLM not configured")
+    if not breaker.allow():
+        metrics.llm_requests.inc(engine=engine, model=model, outcome="breaker_open")
+        raise LLMUnavailableError("LLM circuit breaker open")
+    return client
+
+
+def _record(engine: str, model: str, outcome: str, started: float, usage: Any = None) -> None:
+    metrics.llm_requests.inc(engine=engine, model=model, outcome=outcome)
+    metrics.llm_request_duration.observe(time.perf_counter() - started, engine=engine, model=model)
+    if usage is not None:
+        metrics.llm_tokens.inc(usage.prompt_tokens or 0, engine=engine, model=model, kind="prompt")
+        metrics.llm_tokens.inc(
+            usage.completion_tokens or 0, engine=engine, model=model, kind="completion"
+        )
+
+
+async def _with_retries(attempt: Callable[[], Awaitable[Any]]) -> Any:
+    """Run `attempt` with a per-attempt timeout and jittered exponential backoff."""
+    for n in range(_MAX_RETRIES + 1):
+        try:
+            return await asyncio.wait_for(attempt(), _TIMEOUT)
+        except _RETRYABLE:
+            if n == _MAX_RETRIES or breaker.is_open:
+                raise
+        await asyncio.sleep(random.uniform(0, _RETRY_BACKOFF * 2 ** n))
+
+
+async def chat(engine: str, **kwargs: Any) -> Any:
+    """
+    client.chat.completions.create(**kwargs) for `engine` ("risk", "prep",
+    "intake"), bounded by the gateway's deadline, retries, breaker and
+    per-engine concurrency. Raises LLMUnavailableError on any failure so
+    callers can fall back to their deterministic defaults.
+    """
+    model = kwargs.get("model", OPENAI_MODEL)
+    client = _checked_client(engine, model)
+    started = time.perf_counter()
+
+    async def call() -> Any:
+        async with _semaphore(engine):
+            return await _with_retries(lambda: client.chat.completions.create(**kwargs))
+
+    try:
+        with tracing.span(f"llm.{engine}"):
+            result = await asyncio.wait_for(call(), _DEADLINE)
+    except Exception as e:
+        _record_failure(e)
+        _record(engine, model, "error", started)
+        raise LLMUnavailableError(f"{type(e).__name__}: {e}") from e
+    breaker.record_success()
+    _record(engine, model, "ok", started, getattr(result, "usage", None))
+    return result
+
+
+async def chat_stream(engine: str, **kwargs: Any) -> AsyncIterator[str]:
+    """
+    Streaming chat(): yields the content deltas as they arrive. Retries
+    only happen before the first chunk; after that LLM_TIMEOUT_SECONDS is
+    the longest allowed gap between chunks.
+    """
+    model = kwargs.get("model", OPENAI_MODEL)
+    client = _checked_client(engine, model)
+    sem = _semaphore(engine)
+    started = time.perf_counter()
+    deadline = time.monotonic() + _DEADLINE
+
+    async def open_stream() -> Any:
+        await sem.acquire()
+        try:
+            return await _with_retries(
+                lambda: client.chat.completions.create(
+                    stream=True, stream_options={"include_usage": True}, **kwargs
+                )
+            )
+        except BaseException:
+            sem.release()
+            raise
+
+    try:
+        # The rest of the stream is paced by the client reading it
+        with tracing.span(f"llm.{engine}.first_chunk"):
+            stream = await asyncio.wait_for(open_stream(), _DEADLINE)
+    except Exception as e:
+        _record_failure(e)
+        _record(engine, model, "error", started)
+        raise LLMUnavailableError(f"{type(e).__name__}: {e}") from e
+
+    usage = None
+    try:
+        chunks = stream.__aiter__()
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), max(0.0, min(_TIMEOUT, remaining)))
+            except StopAsyncIteration:
+                break
+            # include_usage: token counts arrive on a last, choice-less chunk
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as e:
+        _record_failure(e)
+        _record(engine, model, "error", started)
+        raise LLMUnavailableError(f"{type(e).__name__}: {e}") from e
+    finally:
+        sem.release()
+        close = getattr(stream, "close", None)
+        if close is not None:
+            await close()
+    breaker.record_success()
+    _record(engine, model, "ok", started, usage)
+
+
+async def aclose() -> None:
+    """Close pooled connections (called on app shutdown)."""
+    global _client
+
+    if _client is not None:
+        await _client.close()
+        _client = None
@@ -0,0 +1,219 @@
+import base64
+import heapq
+import json
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from typing import Callable, DefaultDict, Dict, Iterable, List, Optional, Set, Tuple
+
+from ..models import Patient
+
+# In-memory search index behind GET /patients.
+#
+# Every patient is indexed by first name, last name, email and phone digits:
+#   - sorted term lists answer prefix queries with two binary searches
+#   - trigram posting sets answer substring queries ("mith", "4567")
+# Multi-word queries must match every word. Results are ranked exact term >
+# prefix > substring match, then by name, and paginated with a keyset cursor
+# so pages stay stable while patients are added or edited.
+
+_PHONE_CHARS = re.compile(r"[\s()+\-.]")
+
+_EXACT, _PREFIX, _SUBSTRING = 3, 2, 1
+
+# (negated score, last name, first name, id)
+_SortKey = Tuple[int, str, str, int]
+
+
+def _digits(value: str) -> str:
+    return "".join(c for c in value if c.isdigit())
+
+
+def _local_part(value: str) -> str:
+    return value.split("@", 1)[0]
+
+
+def _trigrams(value: str) -> Set[str]:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def encode_cursor(key: _SortKey) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> _SortKey:
+    """Raises ValueError for anything that isn't a cursor we handed out."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, last, first, pid = json.loads(raw)
+        return (int(score), str(last), str(first), int(pid))
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class _Terms:
+    """
+    Sorted (term, id) pairs + trigram postings for one kind of field.
+    Trigrams are taken from `searchable(term)`, which lets emails skip the
+    shared domain part ("mail", "com" would otherwise match everyone).
+    """
+
+    def __init__(self, searchable: Callable[[str], str] = lambda term: term):
+        self.searchable = searchable
+        self.terms: List[Tuple[str, int]] = []
+        self.grams: Dict[str, Set[int]] = {}
+
+    def build(self, pairs: List[Tuple[str, int]]) -> None:
+        self.terms = sorted(p for p in pairs if p[0])
+        grams: DefaultDict[str, Set[int]] = defaultdict(set)
+        for value, pid in self.terms:
+            text = self.searchable(value)
+            for i in range(len(text) - 2):
+                grams[text[i:i + 3]].add(pid)
+        self.grams = dict(grams)
+
+    def add(self, value: str, pid: int) -> None:
+        if not value:
+            return
+        insort(self.terms, (value, pid))
+        for g in _trigrams(self.searchable(value)):
+            self.grams.setdefault(g, set()).add(pid)
+
+    def remove(self, value: str, pid: int) -> None:
+        if not value:
+            return
+        i = bisect_left(self.terms, (value, pid))
+        if i < len(self.terms) and self.terms[i] == (value, pid):
+            del self.terms[i]
+        for g in _trigrams(self.searchable(value)):
+            ids = self.grams.get(g)
+            if ids is not None:
+                ids.discard(pid)
+                if not ids:
+                    del self.grams[g]
+
+    def match(self, term: str, values: Callable[[int], Iterable[str]]) -> Dict[int, int]:
+        """
+        id -> best match quality. `values(pid)` returns the searchable
+        strings of a patient, to confirm candidates longer than a trigram.
+        """
+        lo = bisect_left(self.terms, (term,))
+        mid = bisect_left(self.terms, (term, float("inf")), lo)
+        hi = bisect_left(self.terms, (term + "\uffff",), mid)
+
+        found: Dict[int, int] = {}
+        grams = sorted((self.grams.get(g, set()) for g in _trigrams(term)), key=len)
+        if grams and grams[0]:
+            candidates = grams[0].intersection(*grams[1:])
+            if len(term) > 3:
+                candidates = {
+                    pid for pid in candidates
+                    if any(term in self.searchable(v) for v in values(pid))
+                }
+            found = dict.fromkeys(candidates, _SUBSTRING)
+        found.update(dict.fromkeys((pid for _, pid in self.terms[mid:hi]), _PREFIX))
+        found.update(dict.fromkeys((pid for _, pid in self.terms[lo:mid]), _EXACT))
+        return found
+
+
+class PatientIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.patients: Dict[int, Patient] = {}
+        # id -> ((first, last, email) lowercased, phone digits)
+        self._fields: Dict[int, Tuple[Tuple[str, str, str], str]] = {}
+        self._names = _Terms(_local_part)
+        self._phones = _Terms()
+        # (last, first, id): name order for ranking ties and empty queries
+        self._name_key: Dict[int, Tuple[str, str, int]] = {}
+        self._by_name: List[Tuple[str, str, int]] = []  # sorted name keys
+
+    def __len__(self) -> int:
+        return len(self.patients)
+
+    @staticmethod
+    def _fields_of(p: Patient) -> Tuple[Tuple[str, str, str], str]:
+        return (p.first_name.lower(), p.last_name.lower(), p.email.lower()), _digits(p.phone)
+
+    def rebuild(self, patients: List[Patient]) -> None:
+        with self._lock:
+            self.patients = {p.id: p for p in patients}
+            self._fields = {p.id: self._fields_of(p) for p in patients}
+            self._names.build(
+                [(v, pid) for pid, (names, _) in self._fields.items() for v in names]
+            )
+            self._phones.build([(digits, pid) for pid, (_, digits) in self._fields.items()])
+            self._name_key = {
+                pid: (names[1], names[0], pid) for pid, (names, _) in self._fields.items()
+            }
+            self._by_name = sorted(self._name_key.values())
+
+    def add(self, p: Patient) -> None:
+        """Index a new patient or re-index an edited one."""
+        with self._lock:
+            self.remove(p.id)
+            names, digits = self._fields_of(p)
+            self.patients[p.id] = p
+            self._fields[p.id] = (names, digits)
+            for value in names:
+                self._names.add(value, p.id)
+            self._phones.add(digits, p.id)
+            self._name_key[p.id] = (names[1], names[0], p.id)
+            insort(self._by_name, self._name_key[p.id])
+
+    def remove(self, patient_id: int) -> None:
+        with self._lock:
+            if patient_id not in self.patients:
+                return
+            names, digits = self._fields.pop(patient_id)
+            del self.patients[patient_id]
+            for value in names:
+                self._names.remove(value, patient_id)
+            self._phones.remove(digits, patient_id)
+            key = self._name_key.pop(patient_id)
+            i = bisect_left(self._by_name, key)
+            if i < len(self._by_name) and self._by_name[i] == key:
+                del self._by_name[i]
+
+    def _match(self, word: str) -> Dict[int, int]:
+        # "(555) 123-4567" style words only search phone numbers
+        if _PHONE_CHARS.sub("", word).isdigit():
+            return self._phones.match(_digits(word), lambda pid: (self._fields[pid][1],))
+        return self._names.match(word, lambda pid: self._fields[pid][0])
+
+    def search(
+        self, query: Optional[str], limit: int, cursor: Optional[str] = None
+    ) -> Tuple[List[Patient], Optional[str]]:
+        """
+        One page of ranked matches plus the cursor for the next page (None
+        on the last page). An empty query lists everyone by name.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        words = (query or "").lower().split()
+
+        with self._lock:
+            if not words:
+                start = bisect_right(self._by_name, after[1:]) if after else 0
+                page = [(0, *row) for row in self._by_name[start:start + limit + 1]]
+            else:
+                scores: Dict[int, int] = {}
+                for n, word in enumerate(words):
+                    matches = self._match(word)
+                    if n == 0:
+                        scores = matches
+                    else:
+                        scores = {pid: s + matches[pid] for pid, s in scores.items() if pid in matches}
+                    if not scores:
+                        break
+                name_key = self._name_key
+                keys = ((-score, name_key[pid]) for pid, score in scores.items())
+                if after is not None:
+                    keys = (k for k in keys if k > (after[0], after[1:]))
+                page = [(k[0], *k[1]) for k in heapq.nsmallest(limit + 1, keys)]
+
+            more = len(page) > limit
+            page = page[:limit]
+            patients = [self.patients[k[3]] for k in page]
+
+        return patients, encode_cursor(page[-1]) if more else None
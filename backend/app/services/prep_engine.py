@@ -1,56 +1,52 @@
-import os
 import json
 from datetime import datetime
-from typing import Dict, Any, Optional
-
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import Any, AsyncIterator, Dict, List, Optional
 
+from . import llm_client, metrics, tracing
+from .cache import fingerprint
 from ..models import Appointment, Patient, Insurance, ClinicalRisk
 
-load_dotenv()
-
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-_OPENAI_ENABLED = os.getenv("OPENAI_ENABLED", "true").lower() == "true"
 
-_client: Optional[OpenAI] = None
+def _age(dob) -> int:
+    today = datetime.utcnow().date()
+    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
 
 
-def _get_client() -> Optional[OpenAI]:
+def prep_fingerprint(
+    appointment: Appointment,
+    patient: Patient,
+    insurance: Insurance,
+    clinical_risk: ClinicalRisk,
+) -> str:
     """
-    Lazy-init OpenAI client.
+    Hash of everything build_prep_summary reads. A stored summary whose
+    fingerprint still matches can be served as-is.
     """
-    global _client
-
-    if not _OPENAI_ENABLED:
-        return None
-
-    if _client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return None
-
-        _client = OpenAI(api_key=api_key)
-
-    return _client
+    return fingerprint(
+        patient,
+        insurance,
+        clinical_risk.model_dump(exclude={"generated_at"}),
+        {
+            "start": appointment.start,
+            "location": appointment.location,
+            "visit_type": appointment.visit_type,
+            "reason_for_visit": appointment.reason_for_visit,
+        },
+    )
 
 
-def _age(dob) -> int:
-    today = datetime.utcnow().date()
-    return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+# Sections built from stored data alone (available before any LLM call)
+BASE_SECTIONS = ("patient_snapshot", "visit_details", "insurance_summary", "risk_assessment")
 
 
-def build_prep_summary(
+def build_base_summary(
     appointment: Appointment,
     patient: Patient,
     insurance: Insurance,
     clinical_risk: ClinicalRisk,
 ) -> Dict[str, Any]:
-    """
-    Builds a pre-visit preparation summary.
-    Rule-based skeleton + optional OpenAI call for richer note template & suggestions.
-    """
-    base_summary: Dict[str, Any] = {
+    """Rule-based skeleton of the prep summary (no LLM)."""
+    return {
         "patient_snapshot": {
             "name": f"{patient.first_name} {patient.last_name}",
             "age": _age(patient.dob),
@@ -91,26 +87,50 @@ def build_prep_summary(
         "generated_at": datetime.utcnow().isoformat(),
     }
 
-    client = _get_client()
-    if client is None:
-        # No OpenAI key / disabled; return a sane default note template
-        base_summary["note_template"] = {
-            "subjective": [
-                "Chief complaint and duration",
-                "Relevant history of present illness",
-            ],
-            "objective": [
-                "Vital signs and focused exam",
-            ],
-            "assessment": [
-                "Working diagnosis / differential",
-            ],
-            "plan": [
-                "Diagnostics, treatment changes, follow-up",
-            ],
-        }
-        return base_summary
 
+def _default_note_template() -> Dict[str, Any]:
+    # No OpenAI key / disabled; a sane default note template
+    return {
+        "subjective": [
+            "Chief complaint and duration",
+            "Relevant history of present illness",
+        ],
+        "objective": [
+            "Vital signs and focused exam",
+        ],
+        "assessment": [
+            "Working diagnosis / differential",
+        ],
+        "plan": [
+            "Diagnostics, treatment changes, follow-up",
+        ],
+    }
+
+
+def _use_fallback(base_summary: Dict[str, Any]) -> None:
+    # LLM configured but failed: default template, flagged so the summary
+    # is rebuilt on the next request instead of being served as fresh
+    metrics.llm_fallbacks.inc(engine="prep", reason="error")
+    base_summary["note_template"] = _default_note_template()
+    base_summary["llm_fallback"] = True
+
+
+def is_fallback(summary: Optional[Dict[str, Any]]) -> bool:
+    """True if `summary` was built with the default template after an LLM failure."""
+    return bool(summary) and bool(summary.get("llm_fallback"))
+
+
+def is_fresh(appointment: Appointment, fp: str) -> bool:
+    """True if the stored prep summary can be served for prep fingerprint `fp`."""
+    summary = appointment.prep_summary
+    return (
+        bool(summary)
+        and appointment.prep_summary_fingerprint == fp
+        and not is_fallback(summary)
+    )
+
+
+def _llm_request(base_summary: Dict[str, Any]) -> Dict[str, Any]:
     system_prompt = (
         "You are an experienced primary care clinician helping prepare for a visit. "
         "Given structured patient, appointment, and insurance context, generate:\n"
@@ -119,12 +139,7 @@ def build_prep_summary(
         "You MUST respond with a single valid JSON object."
     )
 
-    user_context = {
-        "patient_snapshot": base_summary["patient_snapshot"],
-        "visit_details": base_summary["visit_details"],
-        "insurance_summary": base_summary["insurance_summary"],
-        "risk_assessment": base_summary["risk_assessment"],
-    }
+    user_context = {key: base_summary[key] for key in BASE_SECTIONS}
 
     user_prompt = (
         "Here is the visit context as JSON:\n"
@@ -133,20 +148,20 @@ def build_prep_summary(
         "and 'note_template' (object with keys subjective, objective, assessment, plan)."
     )
 
-    chat = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        response_format={"type": "json_object"},
-        messages=[
+    return {
+        "model": llm_client.OPENAI_MODEL,
+        "response_format": {"type": "json_object"},
+        "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt},
         ],
-        max_tokens=400,
-    )
+        "max_tokens": 400,
+    }
 
-    raw_text = chat.choices[0].message.content
-    if not raw_text:
-        return base_summary
 
+def _apply_llm_output(base_summary: Dict[str, Any], raw_text: Optional[str]) -> None:
+    if not raw_text:
+        return
     try:
         parsed = json.loads(raw_text)
         if isinstance(parsed, dict):
@@ -156,6 +171,53 @@ def build_prep_summary(
                 base_summary["note_template"] = parsed["note_template"]
     except Exception:
         # If anything goes wrong, we just keep the base_summary defaults
-        pass
+        metrics.llm_fallbacks.inc(engine="prep", reason="parse_error")
+
+
+async def build_prep_summary(
+    appointment: Appointment,
+    patient: Patient,
+    insurance: Insurance,
+    clinical_risk: ClinicalRisk,
+) -> Dict[str, Any]:
+    """
+    Builds a pre-visit preparation summary.
+    Rule-based skeleton + optional OpenAI call for richer note template & suggestions.
+    """
+    with tracing.span("prep.rules"):
+        base_summary = build_base_summary(appointment, patient, insurance, clinical_risk)
+
+    if llm_client.get_client() is None:
+        metrics.llm_fallbacks.inc(engine="prep", reason="unavailable")
+        base_summary["note_template"] = _default_note_template()
+        return base_summary
 
+    try:
+        chat = await llm_client.chat("prep", **_llm_request(base_summary))
+    except llm_client.LLMUnavailableError:
+        _use_fallback(base_summary)
+        return base_summary
+    _apply_llm_output(base_summary, chat.choices[0].message.content)
     return base_summary
+
+
+async def stream_llm_sections(base_summary: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Fill in `todo_for_clinic` / `note_template` of a summary from
+    build_base_summary, yielding the raw model output as it streams in.
+    `base_summary` is complete once the iterator is exhausted.
+    """
+    if llm_client.get_client() is None:
+        metrics.llm_fallbacks.inc(engine="prep", reason="unavailable")
+        base_summary["note_template"] = _default_note_template()
+        return
+
+    parts: List[str] = []
+    try:
+        async for text in llm_client.chat_stream("prep", **_llm_request(base_summary)):
+            parts.append(text)
+            yield text
+    except llm_client.LLMUnavailableError:
+        _use_fallback(base_summary)
+        return
+    _apply_llm_output(base_summary, "".join(parts))
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from . import data_access, prep_engine, risk_engine, tracing
+from .cache import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Background prep-summary generation (bounded worker pool + retries)
+_CONCURRENCY = int(os.getenv("PREP_QUEUE_CONCURRENCY", "4"))
+_MAX_ATTEMPTS = int(os.getenv("PREP_QUEUE_MAX_ATTEMPTS", "3"))
+_RETRY_BACKOFF_SECONDS = float(os.getenv("PREP_QUEUE_RETRY_BACKOFF_SECONDS", "1.0"))
+
+# How many times we re-read + retry the final write if the appointment
+# changed under us (CAS conflict)
+_PERSIST_ATTEMPTS = 5
+
+_queue: Optional["asyncio.Queue[int]"] = None
+_workers: List[asyncio.Task] = []
+_queued: Set[int] = set()
+
+
+def _ensure_started() -> "asyncio.Queue[int]":
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+        for i in range(max(1, _CONCURRENCY)):
+            _workers.append(asyncio.create_task(_worker(), name=f"prep-worker-{i}"))
+    return _queue
+
+
+async def start() -> None:
+    """
+    Start the workers and re-queue anything left "pending" by a previous
+    run (the queue itself is in-memory and doesn't survive a restart).
+    """
+    _ensure_started()
+    for a in data_access.appointments_pending_prep():
+        enqueue(a.id)
+
+
+async def stop() -> None:
+    global _queue
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    _queued.clear()
+    _queue = None
+
+
+def enqueue(appointment_id: int) -> None:
+    """Schedule prep generation for a booked appointment (deduplicated)."""
+    queue = _ensure_started()
+    if appointment_id in _queued:
+        return
+    _queued.add(appointment_id)
+    queue.put_nowait(appointment_id)
+
+
+def pending_count() -> int:
+    return len(_queued)
+
+
+async def _worker() -> None:
+    assert _queue is not None
+    queue = _queue
+    while True:
+        appointment_id = await queue.get()
+        try:
+            await _generate(appointment_id)
+        except Exception:
+            logger.exception("prep generation crashed for appointment %s", appointment_id)
+        finally:
+            _queued.discard(appointment_id)
+            queue.task_done()
+
+
+async def _generate(appointment_id: int) -> None:
+    appointment = data_access.get_appointment(appointment_id)
+    # Cancelled / rebooked since it was queued -> nothing to do
+    if appointment is None or appointment.status != "booked":
+        return
+
+    for attempt in range(1, _MAX_ATTEMPTS + 1):
+        try:
+            summary = await generate(appointment_id)
+            if not prep_engine.is_fallback(summary):
+                return
+            # The LLM call failed and we only got the default template
+            logger.warning(
+                "prep generation attempt %s/%s fell back to the default template for appointment %s",
+                attempt, _MAX_ATTEMPTS, appointment_id,
+            )
+        except Exception:
+            logger.warning(
+                "prep generation attempt %s/%s failed for appointment %s",
+                attempt, _MAX_ATTEMPTS, appointment_id, exc_info=True,
+            )
+        if attempt == _MAX_ATTEMPTS:
+            await _persist(appointment_id, {"prep_summary_status": "failed"})
+            return
+        await asyncio.sleep(_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+
+# ---------------------------------------------------------------------------
+# Cached, single-flight generation (shared by the queue and GET /prep-summary)
+# ---------------------------------------------------------------------------
+
+_flights: "SingleFlight[Optional[Dict[str, Any]]]" = SingleFlight()
+
+
+async def generate(appointment_id: int, force: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Return the prep summary for a booked appointment.
+
+    The stored summary is reused while its fingerprint (patient, insurance,
+    risk, visit details) still matches; otherwise, or when `force` is set,
+    a new one is built (and persisted, if the appointment is booked).
+    Concurrent calls for the same appointment share a single in-flight
+    build; forced calls are keyed apart, so a refresh never joins a build
+    that started from the stored summary. Returns None if the appointment
+    is gone or has no patient.
+    """
+    with tracing.span("prep.generate"):
+        return await _flights.do((appointment_id, force), lambda: _generate_once(appointment_id, force))
+
+
+async def _load_context(appointment_id: int):
+    """
+    (appointment, patient, insurance, risk, prep fingerprint) for an
+    appointment, or None if it is gone or has no patient.
+    """
+    appointment = data_access.get_appointment(appointment_id)
+    if appointment is None or not appointment.patient_id:
+        return None
+
+    patient = data_access.get_patient(appointment.patient_id)
+    if patient is None:
+        raise LookupError(f"patient {appointment.patient_id} not found")
+    insurance = data_access.get_insurance(patient.insurance_id)
+    if insurance is None:
+        raise LookupError(f"insurance {patient.insurance_id} not found")
+
+    risk = appointment.clinical_risk or await risk_engine.calculate_risk(
+        patient=patient,
+        insurance=insurance,
+        proposed_reason=appointment.reason_for_visit or "",
+        history=data_access.patient_history(patient.id),
+    )
+
+    fp = prep_engine.prep_fingerprint(appointment, patient, insurance, risk)
+    return appointment, patient, insurance, risk, fp
+
+
+def _ready_update(risk, summary: Dict[str, Any], fp: str) -> Dict[str, Any]:
+    return {
+        "clinical_risk": risk,
+        "prep_summary": summary,
+        "prep_summary_status": "ready",
+        "prep_summary_fingerprint": fp,
+    }
+
+
+async def _generate_once(appointment_id: int, force: bool) -> Optional[Dict[str, Any]]:
+    context = await _load_context(appointment_id)
+    if context is None:
+        return None
+    appointment, patient, insurance, risk, fp = context
+
+    if not force and prep_engine.is_fresh(appointment, fp):
+        return appointment.prep_summary
+
+    summary = await prep_engine.build_prep_summary(
+        appointment=appointment,
+        patient=patient,
+        insurance=insurance,
+        clinical_risk=risk,
+    )
+    # A fallback is still handed to this caller, but never stored as
+    # "ready": the queue retries it and the next request rebuilds it
+    if not prep_engine.is_fallback(summary):
+        await _persist(appointment_id, _ready_update(risk, summary, fp))
+    return summary
+
+
+async def stream(appointment_id: int, force: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of generate(), as (event, data) pairs:
+
+      "sections" - the rule-based sections, sent before any LLM work
+      "delta"    - raw LLM output for todo_for_clinic / note_template
+      "summary"  - the complete summary (persisted like generate())
+
+    A fresh stored summary, or one already being built for this
+    appointment with the same `force`, is sent as "summary" straight
+    after "sections".
+    """
+    context = await _load_context(appointment_id)
+    if context is None:
+        return
+    appointment, patient, insurance, risk, fp = context
+
+    summary = prep_engine.build_base_summary(appointment, patient, insurance, risk)
+    yield "sections", {key: summary[key] for key in prep_engine.BASE_SECTIONS}
+
+    if not force and prep_engine.is_fresh(appointment, fp):
+        yield "summary", appointment.prep_summary
+        return
+    task = _flights.get((appointment_id, force))
+    if task is not None:
+        yield "summary", await asyncio.shield(task)
+        return
+
+    # Register the build like generate() does, so GETs and other streams
+    # for this appointment (with the same `force`) wait for it instead of
+    # making their own LLM call. It runs as its own task and keeps going if this
+    # client disconnects; we only relay its output.
+    deltas: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+    async def build() -> Dict[str, Any]:
+        try:
+            async for text in prep_engine.stream_llm_sections(summary):
+                deltas.put_nowait(text)
+        finally:
+            deltas.put_nowait(None)
+        if not prep_engine.is_fallback(summary):
+            await _persist(appointment_id, _ready_update(risk, summary, fp))
+        return summary
+
+    task = _flights.start((appointment_id, force), build)
+    while (text := await deltas.get()) is not None:
+        yield "delta", text
+    yield "summary", await asyncio.shield(task)
+
+
+async def _persist(appointment_id: int, update: Dict[str, Any]) -> None:
+    """
+    Apply `update` onto the *current* version of the appointment. The
+    journal / SQLite write runs in a worker thread, off the event loop.
+    """
+    await asyncio.to_thread(_persist_sync, appointment_id, update)
+
+
+def _persist_sync(appointment_id: int, update: Dict[str, Any]) -> None:
+    for _ in range(_PERSIST_ATTEMPTS):
+        current = data_access.get_appointment(appointment_id)
+        if current is None or current.status != "booked":
+            return
+        try:
+            data_access.compare_and_swap_appointment(
+                current.model_copy(update=update), current.version
+            )
+            return
+        except data_access.StaleAppointmentError:
+            continue
+    logger.error("could not persist prep summary for appointment %s", appointment_id)
@@ -1,41 +1,45 @@
 import os
 import json
+import re
 from datetime import datetime, date
 from typing import Optional, List, Dict
 
-from dotenv import load_dotenv
-from openai import OpenAI
+from . import llm_client, metrics, tracing
+from .cache import SingleFlight, TTLCache, fingerprint
+from ..models import (
+    Patient,
+    Insurance,
+    Appointment,
+    ClinicalRisk,
+    PatientHistory,
+    VisitHistoryItem,
+)
 
-from ..models import Patient, Insurance, Appointment, ClinicalRisk
+# How much appointment history goes into each risk prompt
+HISTORY_VISITS = int(os.getenv("RISK_HISTORY_VISITS", "10"))
+HISTORY_REASONS = int(os.getenv("RISK_HISTORY_REASONS", "5"))
 
-load_dotenv()
+# Memoized risk scores (see calculate_risk)
+_RISK_CACHE_SIZE = int(os.getenv("RISK_CACHE_SIZE", "1024"))
+_RISK_CACHE_TTL_SECONDS = float(os.getenv("RISK_CACHE_TTL_SECONDS", "300"))
 
-# Env config
-_OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-_OPENAI_ENABLED = os.getenv("OPENAI_ENABLED", "true").lower() == "true"
+_risk_cache: TTLCache[ClinicalRisk] = TTLCache(maxsize=_RISK_CACHE_SIZE, ttl=_RISK_CACHE_TTL_SECONDS)
+_llm_flights: SingleFlight[ClinicalRisk] = SingleFlight()
 
-_client: Optional[OpenAI] = None
+# Fallback factors that mean "the LLM failed this time" -> never cache those
+_TRANSIENT_FACTORS = {"llm_error_default_medium_risk", "llm_parse_error_default_medium_risk"}
 
+# Rules-first scoring: the LLM is only asked when the rule score lands in
+# [RISK_LLM_BAND_MIN, RISK_LLM_BAND_MAX]. Set MIN > MAX to never call it.
+_RULES_ENABLED = os.getenv("RISK_RULES_ENABLED", "true").lower() == "true"
+_LLM_BAND_MIN = int(os.getenv("RISK_LLM_BAND_MIN", "35"))
+_LLM_BAND_MAX = int(os.getenv("RISK_LLM_BAND_MAX", "65"))
 
-def _get_client() -> Optional[OpenAI]:
-    """
-    Lazy-init OpenAI client.
-    Does NOT crash the app if the key is missing or OpenAI is disabled.
-    """
-    global _client
-
-    if not _OPENAI_ENABLED:
-        return None
-
-    if _client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return None
-
-        _client = OpenAI(api_key=api_key)
-
-    return _client
+# Any LLM fallback (disabled, error, unparseable) -> use the rule score instead
+_FALLBACK_FACTORS = _TRANSIENT_FACTORS | {"llm_unavailable_default_medium_risk"}
 
+_NO_SHOW_STATUSES = {"no_show", "no-show", "noshow"}
+_CANCELLED_STATUSES = {"cancelled", "canceled"}
 
 def _age(dob) -> int:
     """Compute age from a date or ISO string."""
@@ -52,11 +56,200 @@ def _age(dob) -> int:
     )
 
 
+def build_patient_history(patient_id: int, appointments: List[Appointment]) -> PatientHistory:
+    """
+    Condense one patient's appointments into the fixed-size history the risk
+    prompt needs: last HISTORY_VISITS visits (no prep summaries / notes),
+    no-show and cancellation counts, and recent distinct reasons.
+
+    Open slots that merely reference the patient are not visits and are skipped.
+    """
+    visits = sorted(
+        (a for a in appointments if a.status != "available"),
+        key=lambda a: a.start,
+        reverse=True,
+    )
+
+    recent_reasons: List[str] = []
+    for a in visits:
+        reason = (a.reason_for_visit or "").strip()
+        if reason and reason not in recent_reasons:
+            recent_reasons.append(reason)
+            if len(recent_reasons) >= HISTORY_REASONS:
+                break
+
+    return PatientHistory(
+        patient_id=patient_id,
+        recent_visits=[
+            VisitHistoryItem(
+                appointment_id=a.id,
+                start=a.start,
+                status=a.status,
+                visit_type=a.visit_type,
+                reason_for_visit=a.reason_for_visit,
+                risk_level=a.clinical_risk.risk_level if a.clinical_risk else None,
+            )
+            for a in visits[:HISTORY_VISITS]
+        ],
+        total_visits=len(visits),
+        no_show_count=sum(1 for a in visits if a.status.lower() in _NO_SHOW_STATUSES),
+        cancelled_count=sum(1 for a in visits if a.status.lower() in _CANCELLED_STATUSES),
+        recent_reasons=recent_reasons,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Deterministic rules (same heuristics the LLM prompt describes)
+# ---------------------------------------------------------------------------
+
+_BASE_SCORE = 10
+
+# (min_age, points, factor), checked top-down
+_AGE_BANDS = [
+    (75, 25, "age_75_plus"),
+    (65, 15, "age_65_74"),
+    (50, 8, "age_50_64"),
+]
+
+# Matched as whole words ("type_2_diabetes" yes, "prediabetes" no)
+_HIGH_RISK_CONDITIONS = (
+    "heart_failure",
+    "coronary",
+    "cad",
+    "copd",
+    "diabetes",
+    "asthma",
+    "kidney_disease",
+)
+_CONDITION_POINTS, _CONDITION_CAP = 10, 25
+
+_FLAG_POINTS = {
+    "high_cardiac_risk": 15,
+    "behavioral_health": 10,
+    "frequent_no_show": 8,
+}
+_OTHER_FLAG_POINTS, _FLAG_CAP = 3, 25
+
+_NO_SHOW_POINTS, _NO_SHOW_CAP = 5, 15
+_CANCEL_POINTS, _CANCEL_CAP = 2, 6
+
+# Matched on word boundaries against the normalized reason
+_RED_FLAG_REASONS = {
+    re.compile(p): factor
+    for p, factor in {
+        r"\bchest pain": "red_flag_chest_pain",
+        r"\bshortness of breath|\bdifficulty breathing": "red_flag_shortness_of_breath",
+        r"\bsuicid": "red_flag_suicidal_ideation",
+        r"\boverdose": "red_flag_overdose",
+        r"\bpsych(iatric)? crisis": "red_flag_psych_crisis",
+        r"\b(ed|er|emergency room|emergency department)\b.*\bfollow": "recent_ed_followup",
+    }.items()
+}
+_RED_FLAG_MIN_SCORE = 80
+
+_ROUTINE_REASONS = ("annual", "wellness", "physical", "checkup", "check-up", "refill")
+_ROUTINE_POINTS = -10
+
+
+def _norm_token(value: str) -> str:
+    return "_".join(str(value).lower().replace("-", " ").split())
+
+
+def _is_high_risk_condition(condition: str) -> bool:
+    words = "_" + "_".join(re.findall(r"[a-z0-9]+", condition.lower())) + "_"
+    return any(f"_{k}_" in words for k in _HIGH_RISK_CONDITIONS)
+
+
+def score_risk_with_rules(
+    patient: Patient,
+    insurance: Insurance,
+    proposed_reason: str,
+    history: Optional[PatientHistory] = None,
+) -> ClinicalRisk:
+    """
+    Local rule-based scorer. No I/O: table lookups and a few string checks,
+    so it runs in microseconds and can be mapped over many patients at once.
+    """
+    score = _BASE_SCORE
+    factors: List[str] = []
+
+    try:
+        age = _age(patient.dob)
+    except Exception:
+        age = None
+    if age is not None:
+        for min_age, points, factor in _AGE_BANDS:
+            if age >= min_age:
+                score += points
+                factors.append(factor)
+                break
+
+    conditions = [_norm_token(c) for c in patient.chronic_conditions]
+    matched = [c for c in conditions if _is_high_risk_condition(c)]
+    if matched:
+        score += min(_CONDITION_CAP, _CONDITION_POINTS * len(matched))
+        factors += [f"chronic_{c}" for c in matched]
+
+    flag_points = 0
+    for flag in (_norm_token(f) for f in patient.risk_flags):
+        flag_points += _FLAG_POINTS.get(flag, _OTHER_FLAG_POINTS)
+        factors.append(f"flag_{flag}")
+    score += min(_FLAG_CAP, flag_points)
+
+    no_shows = max(patient.no_show_count, history.no_show_count if history else 0)
+    if no_shows:
+        score += min(_NO_SHOW_CAP, _NO_SHOW_POINTS * no_shows)
+        factors.append("prior_no_shows")
+    cancellations = history.cancelled_count if history else 0
+    if cancellations:
+        score += min(_CANCEL_CAP, _CANCEL_POINTS * cancellations)
+        factors.append("prior_cancellations")
+
+    if not insurance.eligible:
+        score += 10
+        factors.append("insurance_not_eligible")
+    elif insurance.eligibility_status.lower() != "eligible":
+        score += 5
+        factors.append("insurance_eligibility_unclear")
+    if insurance.requires_referral:
+        score += 5
+        factors.append("referral_required")
+
+    reason = _normalize_reason(proposed_reason)
+    red_flags = sorted({f for pattern, f in _RED_FLAG_REASONS.items() if pattern.search(reason)})
+    if red_flags:
+        score = max(score, _RED_FLAG_MIN_SCORE)
+        factors += red_flags
+    elif any(k in reason for k in _ROUTINE_REASONS):
+        score += _ROUTINE_POINTS
+        factors.append("routine_visit_reason")
+
+    score = max(0, min(100, score))
+    if score >= 70:
+        level, urgency = "high", "within_24_hours" if red_flags else "within_48_hours"
+    elif score >= 30:
+        level, urgency = "medium", "within_7_days"
+    else:
+        level, urgency = "low", "routine"
+
+    return ClinicalRisk(
+        risk_score=score,
+        risk_level=level,
+        factors=factors or ["no_major_risk_factors"],
+        recommended_urgency=urgency,
+        generated_at=datetime.utcnow(),
+    )
+
+
+def _is_ambiguous(rule_risk: ClinicalRisk) -> bool:
+    return _LLM_BAND_MIN <= rule_risk.risk_score <= _LLM_BAND_MAX
+
+
 def _build_llm_payload(
     patient: Patient,
     insurance: Insurance,
     proposed_reason: str,
-    existing_appointments: List[Appointment],
+    history: Optional[PatientHistory],
 ) -> Dict:
     """
     Build a compact JSON payload with derived fields (like age) that
@@ -70,7 +263,8 @@ def _build_llm_payload(
 
     patient_dict = patient.model_dump()
     insurance_dict = insurance.model_dump()
-    appointments_dicts = [a.model_dump() for a in existing_appointments]
+    history = history or PatientHistory(patient_id=patient.id)
+    history_dict = history.model_dump(exclude={"patient_id"})
 
     return {
         "patient": {
@@ -83,15 +277,15 @@ def _build_llm_payload(
         },
         "insurance": insurance_dict,
         "proposed_reason": proposed_reason,
-        "existing_appointments": appointments_dicts,
+        "history": history_dict,
     }
 
 
-def _call_llm_for_risk(
+async def _call_llm_for_risk(
     patient: Patient,
     insurance: Insurance,
     proposed_reason: str,
-    existing_appointments: List[Appointment],
+    history: Optional[PatientHistory],
 ) -> Dict:
     """
     Pure LLM-based risk scoring.
@@ -101,16 +295,17 @@ def _call_llm_for_risk(
     insurance eligibility, visit reason keywords, etc.), but now learns/applies
     that inside the prompt and outputs a structured JSON schema.
     """
-    client = _get_client()
+    client = llm_client.get_client()
     payload = _build_llm_payload(
         patient=patient,
         insurance=insurance,
         proposed_reason=proposed_reason,
-        existing_appointments=existing_appointments,
+        history=history,
     )
 
     # If LLM is disabled or key missing -> deterministic default
     if client is None:
+        metrics.llm_fallbacks.inc(engine="risk", reason="unavailable")
         return {
             "risk_score": 50,  # midline
             "risk_level": "medium",
@@ -125,7 +320,8 @@ def _call_llm_for_risk(
         "- patient: demographics, chronic_conditions, risk_flags, no_show_count\n"
         "- insurance: eligibility info, plan, requires_referral, etc.\n"
         "- proposed_reason: free-text reason for the upcoming visit\n"
-        "- existing_appointments: recent appointment history (including statuses like 'no_show' or 'cancelled').\n\n"
+        "- history: this patient's recent visits (newest first, with statuses like 'no_show' or 'cancelled'), "
+        "no_show_count / cancelled_count over all visits, and recent visit reasons.\n\n"
         "Use these heuristic principles (you can weigh them, not just add them):\n"
         "- Older age increases risk: especially >=75, then 65–74, then 50–64.\n"
         "- High-risk chronic conditions (e.g., heart failure, CAD, COPD, diabetes, asthma) increase risk.\n"
@@ -158,8 +354,9 @@ def _call_llm_for_risk(
     )
 
     try:
-        chat = client.chat.completions.create(
-            model=_OPENAI_MODEL,
+        chat = await llm_client.chat(
+            "risk",
+            model=llm_client.OPENAI_MODEL,
             response_format={"type": "json_object"},
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -167,8 +364,9 @@ def _call_llm_for_risk(
             ],
             max_tokens=400,
         )
-    except Exception:
-        # Network / API errors -> deterministic fallback
+    except llm_client.LLMUnavailableError:
+        # Timeout / API errors / breaker open -> deterministic fallback
+        metrics.llm_fallbacks.inc(engine="risk", reason="error")
         return {
             "risk_score": 50,
             "risk_level": "medium",
@@ -182,6 +380,7 @@ def _call_llm_for_risk(
     try:
         parsed = json.loads(raw_text)
     except Exception:
+        metrics.llm_fallbacks.inc(engine="risk", reason="parse_error")
         return {
             "risk_score": 50,
             "risk_level": "medium",
@@ -246,21 +445,21 @@ def _call_llm_for_risk(
     }
 
 
-def score_risk_with_llm(
+async def score_risk_with_llm(
     patient: Patient,
     insurance: Insurance,
     proposed_reason: str,
-    existing_appointments: List[Appointment],
+    history: Optional[PatientHistory] = None,
 ) -> ClinicalRisk:
     """
     Used by /risk/preview and /appointments/available.
     Pure LLM-based risk scoring -> ClinicalRisk model.
     """
-    result = _call_llm_for_risk(
+    result = await _call_llm_for_risk(
         patient=patient,
         insurance=insurance,
         proposed_reason=proposed_reason,
-        existing_appointments=existing_appointments,
+        history=history,
     )
 
     return ClinicalRisk(
@@ -272,19 +471,70 @@ def score_risk_with_llm(
     )
 
 
-def calculate_risk(
+def _normalize_reason(reason: str) -> str:
+    return " ".join((reason or "").lower().split())
+
+
+def risk_fingerprint(
     patient: Patient,
     insurance: Insurance,
     proposed_reason: str,
-    existing_appointments: List[Appointment],
+    history: Optional[PatientHistory] = None,
+) -> str:
+    """Cache key covering every input the risk score depends on."""
+    return fingerprint(patient, insurance, _normalize_reason(proposed_reason), history)
+
+
+def is_transient(risk: ClinicalRisk) -> bool:
+    """True if `risk` is a default score left behind by a failed LLM call."""
+    return bool(_TRANSIENT_FACTORS.intersection(risk.factors))
+
+
+async def calculate_risk(
+    patient: Patient,
+    insurance: Insurance,
+    proposed_reason: str,
+    history: Optional[PatientHistory] = None,
 ) -> ClinicalRisk:
     """
     Used by /appointments/book and prep flows.
-    Currently just delegates to the LLM-based scorer.
+
+    Rules first: clear-cut cases (rule score outside the RISK_LLM_BAND_*
+    ambiguity band) are answered locally without a network call. Ambiguous
+    ones go to the LLM; if it is unavailable or fails we keep the rule score.
+
+    LLM results are memoized on a fingerprint of patient, insurance,
+    normalized reason and history, so the preview -> available -> book
+    sequence pays for one LLM call. Editing any input changes the
+    fingerprint, so stale scores are never served; old entries just age out
+    (LRU + TTL).
     """
-    return score_risk_with_llm(
-        patient=patient,
-        insurance=insurance,
-        proposed_reason=proposed_reason,
-        existing_appointments=existing_appointments,
-    )
+    rule_risk: Optional[ClinicalRisk] = None
+    if _RULES_ENABLED:
+        with tracing.span("risk.rules"):
+            rule_risk = score_risk_with_rules(patient, insurance, proposed_reason, history)
+        if not _is_ambiguous(rule_risk):
+            return rule_risk
+
+    key = risk_fingerprint(patient, insurance, proposed_reason, history)
+    cached = _risk_cache.get(key)
+    if cached is not None:
+        return cached.model_copy()
+
+    # Identical requests arriving together (double clicks, preview +
+    # available) share one LLM call
+    with tracing.span("risk.llm"):
+        risk = await _llm_flights.do(
+            key,
+            lambda: score_risk_with_llm(
+                patient=patient,
+                insurance=insurance,
+                proposed_reason=proposed_reason,
+                history=history,
+            ),
+        )
+    if rule_risk is not None and _FALLBACK_FACTORS.intersection(risk.factors):
+        return rule_risk
+    if not is_transient(risk):
+        _risk_cache.set(key, risk)
+    return risk.model_copy()
@@ -0,0 +1,453 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+from . import risk_engine, tracing
+from .patient_search import PatientIndex
+from ..models import Patient, Appointment, Insurance, PatientHistory
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+SQLITE_PATH = Path(os.getenv("SQLITE_PATH", str(BASE_DIR / "data" / "clinic.db")))
+
+# Each record is stored as its full JSON document (`data`), with the columns we
+# filter / sort on pulled out next to it so SQLite can index them.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS insurances (
+    id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    start TEXT NOT NULL,
+    provider_id INTEGER,
+    patient_id INTEGER,
+    version INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_appointments_provider_start ON appointments (provider_id, start);
+CREATE INDEX IF NOT EXISTS idx_appointments_status_start ON appointments (status, start);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (patient_id);
+-- Every patient write, from any process, for the search index (see
+-- _synced_patient_index); pruned to the last _PATIENT_CHANGES_KEPT rows
+CREATE TABLE IF NOT EXISTS patient_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS patients_changed_insert AFTER INSERT ON patients BEGIN
+    INSERT INTO patient_changes (patient_id) VALUES (NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS patients_changed_update AFTER UPDATE ON patients BEGIN
+    INSERT INTO patient_changes (patient_id) VALUES (NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS patients_changed_delete AFTER DELETE ON patients BEGIN
+    INSERT INTO patient_changes (patient_id) VALUES (OLD.id);
+END;
+
+-- Small partial index: bookings still waiting for their prep summary
+CREATE INDEX IF NOT EXISTS idx_appointments_prep_pending ON appointments (id)
+    WHERE status = 'booked' AND json_extract(data, '$.prep_summary_status') = 'pending';
+"""
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+# Patient search index, built from the patients table on first search.
+# Before each search it replays patient_changes past `_patient_index_seq`,
+# so writes by other workers or tools show up too.
+_patient_index: Optional[PatientIndex] = None
+_patient_index_seq = 0
+_patient_index_lock = threading.Lock()
+
+# Replaying more changes than this is slower than a rebuild
+_PATIENT_INDEX_MAX_REPLAY = 1000
+_PATIENT_CHANGES_KEPT = 10000
+
+# Default slots fetched per query by iter_available_appointments
+_SLOT_CHUNK = 500
+
+
+def _connect() -> sqlite3.Connection:
+    """One connection per thread (sqlite3 connections aren't thread-safe)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        SQLITE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(SQLITE_PATH, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _migrate(conn)
+        _local.conn = conn
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Bring databases created by older versions up to the current schema."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(appointments)")}
+    if "version" not in columns:
+        conn.execute("ALTER TABLE appointments ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+@contextmanager
+def _transaction():
+    conn = _connect()
+    with tracing.span("storage.sqlite_write"), _write_lock:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _ts(value: datetime) -> str:
+    # ISO-8601 sorts lexicographically in time order for naive datetimes
+    return value.isoformat()
+
+
+def _appointment_row(a: Appointment):
+    return (
+        a.id, a.status, _ts(a.start), a.provider_id, a.patient_id, a.version, a.model_dump_json()
+    )
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+
+def _validate_rows(model: Type[BaseModel], rows: Iterable) -> list:
+    """Validate the JSON `data` column of many rows in one pydantic-core call."""
+    return _list_adapter(model).validate_json("[" + ",".join(r[0] for r in rows) + "]")
+
+
+def _query_appointments(where: str, params: Iterable) -> List[Appointment]:
+    with tracing.span("storage.sqlite_query"):
+        rows = _connect().execute(
+            f"SELECT data FROM appointments WHERE {where} ORDER BY start", tuple(params)
+        ).fetchall()
+        return _validate_rows(Appointment, rows)
+
+
+def _range_clause(start_from: Optional[datetime], start_to: Optional[datetime], params: list) -> str:
+    clause = ""
+    if start_from is not None:
+        clause += " AND start >= ?"
+        params.append(_ts(start_from))
+    if start_to is not None:
+        clause += " AND start < ?"
+        params.append(_ts(start_to))
+    return clause
+
+
+def warm_cache() -> None:
+    """Open the connection and make sure the schema exists."""
+    _connect()
+
+
+def invalidate_cache() -> None:
+    # Only the search index is cached in-process; SQLite's page cache
+    # handles reads.
+    global _patient_index
+    with _patient_index_lock:
+        _patient_index = None
+
+
+def close() -> None:
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def load_patients() -> List[Patient]:
+    rows = _connect().execute("SELECT data FROM patients ORDER BY id")
+    return _validate_rows(Patient, rows)
+
+
+def load_insurances() -> List[Insurance]:
+    rows = _connect().execute("SELECT data FROM insurances ORDER BY id")
+    return _validate_rows(Insurance, rows)
+
+
+def load_appointments() -> List[Appointment]:
+    rows = _connect().execute("SELECT data FROM appointments ORDER BY id")
+    return _validate_rows(Appointment, rows)
+
+
+def save_patients(patients: List[Patient]) -> None:
+    with _transaction() as conn:
+        conn.execute("DELETE FROM patients")
+        conn.executemany(
+            "INSERT INTO patients (id, data) VALUES (?, ?)",
+            ((p.id, p.model_dump_json()) for p in patients),
+        )
+        _prune_patient_changes(conn)
+
+
+def save_patient(patient: Patient) -> None:
+    with _transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO patients (id, data) VALUES (?, ?)",
+            (patient.id, patient.model_dump_json()),
+        )
+        _prune_patient_changes(conn)
+
+
+def _prune_patient_changes(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "DELETE FROM patient_changes WHERE seq <= (SELECT MAX(seq) FROM patient_changes) - ?",
+        (_PATIENT_CHANGES_KEPT,),
+    )
+
+
+def save_insurances(insurances: List[Insurance]) -> None:
+    with _transaction() as conn:
+        conn.execute("DELETE FROM insurances")
+        conn.executemany(
+            "INSERT INTO insurances (id, data) VALUES (?, ?)",
+            ((i.id, i.model_dump_json()) for i in insurances),
+        )
+
+
+def save_appointments(appointments: List[Appointment]) -> None:
+    with _transaction() as conn:
+        conn.execute("DELETE FROM appointments")
+        conn.executemany(
+            "INSERT INTO appointments (id, status, start, provider_id, patient_id, version, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (_appointment_row(a) for a in appointments),
+        )
+
+
+def save_appointment(appointment: Appointment) -> None:
+    with _write_lock:
+        _connect().execute(
+            "INSERT OR REPLACE INTO appointments "
+            "(id, status, start, provider_id, patient_id, version, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            _appointment_row(appointment),
+        )
+
+
+def compare_and_swap_appointment(appointment: Appointment, expected_version: int) -> Appointment:
+    """
+    Conditional UPDATE on (id, version): safe across threads *and* worker
+    processes sharing the same database file.
+    """
+    from .data_access import StaleAppointmentError
+
+    saved = appointment.model_copy(update={"version": expected_version + 1})
+    row = _appointment_row(saved)
+    with _write_lock:
+        cur = _connect().execute(
+            "UPDATE appointments SET status = ?, start = ?, provider_id = ?, patient_id = ?, "
+            "version = ?, data = ? WHERE id = ? AND version = ?",
+            (*row[1:], saved.id, expected_version),
+        )
+    if cur.rowcount != 1:
+        raise StaleAppointmentError(appointment.id)
+    return saved
+
+
+def compare_and_swap_many(
+    items: List[Tuple[Appointment, int]],
+) -> Tuple[List[Appointment], List[int]]:
+    """All conditional UPDATEs in one transaction (one commit / fsync)."""
+    saved: List[Appointment] = []
+    conflicts: List[int] = []
+    with _transaction() as conn:
+        for appointment, expected_version in items:
+            new = appointment.model_copy(update={"version": expected_version + 1})
+            row = _appointment_row(new)
+            cur = conn.execute(
+                "UPDATE appointments SET status = ?, start = ?, provider_id = ?, patient_id = ?, "
+                "version = ?, data = ? WHERE id = ? AND version = ?",
+                (*row[1:], new.id, expected_version),
+            )
+            if cur.rowcount == 1:
+                saved.append(new)
+            else:
+                conflicts.append(appointment.id)
+    return saved, conflicts
+
+
+def compact_appointments() -> None:
+    # Writes go straight into the database; nothing to fold back.
+    pass
+
+
+def get_patient(patient_id: int) -> Optional[Patient]:
+    row = _connect().execute("SELECT data FROM patients WHERE id = ?", (patient_id,)).fetchone()
+    return Patient.model_validate_json(row[0]) if row else None
+
+
+def get_insurance(insurance_id: int) -> Optional[Insurance]:
+    row = _connect().execute("SELECT data FROM insurances WHERE id = ?", (insurance_id,)).fetchone()
+    return Insurance.model_validate_json(row[0]) if row else None
+
+
+def get_appointment(appointment_id: int) -> Optional[Appointment]:
+    row = _connect().execute(
+        "SELECT data FROM appointments WHERE id = ?", (appointment_id,)
+    ).fetchone()
+    return Appointment.model_validate_json(row[0]) if row else None
+
+
+def search_patients(
+    query: Optional[str], limit: int = 50, cursor: Optional[str] = None
+) -> Tuple[List[Patient], Optional[str]]:
+    with tracing.span("patients.search"):
+        return _synced_patient_index().search(query, limit, cursor)
+
+
+def _synced_patient_index() -> PatientIndex:
+    """
+    The search index, brought up to date with patient_changes: changed
+    patients are re-indexed one by one, or the whole index is rebuilt when
+    it is new, far behind, or behind rows that were already pruned.
+    """
+    global _patient_index, _patient_index_seq
+    conn = _connect()
+    with _patient_index_lock:
+        # One read transaction: the changes and the rows they point at come
+        # from the same snapshot
+        conn.execute("BEGIN")
+        try:
+            low, head = conn.execute(
+                "SELECT COALESCE(MIN(seq), 0), COALESCE(MAX(seq), 0) FROM patient_changes"
+            ).fetchone()
+            index = _patient_index
+            if index is not None and head == _patient_index_seq:
+                return index
+            if (
+                index is None
+                or head - _patient_index_seq > _PATIENT_INDEX_MAX_REPLAY
+                or low > _patient_index_seq + 1
+            ):
+                index = PatientIndex()
+                index.rebuild(load_patients())
+            else:
+                changed = {
+                    r[0] for r in conn.execute(
+                        "SELECT DISTINCT patient_id FROM patient_changes WHERE seq > ?",
+                        (_patient_index_seq,),
+                    )
+                }
+                for pid in changed:
+                    patient = get_patient(pid)
+                    if patient is None:
+                        index.remove(pid)
+                    else:
+                        index.add(patient)
+            _patient_index, _patient_index_seq = index, head
+            return index
+        finally:
+            conn.execute("COMMIT")
+
+
+def appointments_for_patient(patient_id: int, status: Optional[str] = None) -> List[Appointment]:
+    where = "patient_id = ?"
+    params: list = [patient_id]
+    if status is not None:
+        where += " AND status = ?"
+        params.append(status)
+    return _query_appointments(where, params)
+
+
+def appointments_for_provider(
+    provider_id: int,
+    status: Optional[str] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+) -> List[Appointment]:
+    where = "provider_id = ?"
+    params: list = [provider_id]
+    if status is not None:
+        where += " AND status = ?"
+        params.append(status)
+    where += _range_clause(start_from, start_to, params)
+    return _query_appointments(where, params)
+
+
+def patient_history(patient_id: int) -> PatientHistory:
+    rows = _query_appointments("patient_id = ? AND status != ?", [patient_id, "available"])
+    return risk_engine.build_patient_history(patient_id, rows)
+
+
+def appointments_by_status(
+    status: str,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+) -> List[Appointment]:
+    params: list = [status]
+    where = "status = ?" + _range_clause(start_from, start_to, params)
+    return _query_appointments(where, params)
+
+
+def appointments_pending_prep() -> List[Appointment]:
+    """Booked appointments whose prep summary is still "pending"."""
+    with tracing.span("storage.sqlite_query"):
+        rows = _connect().execute(
+            "SELECT data FROM appointments INDEXED BY idx_appointments_prep_pending"
+            " WHERE status = 'booked' AND json_extract(data, '$.prep_summary_status') = 'pending'"
+            " ORDER BY id"
+        ).fetchall()
+        return _validate_rows(Appointment, rows)
+
+
+def available_appointments(
+    provider_id: Optional[int] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+) -> List[Appointment]:
+    if provider_id is not None:
+        return appointments_for_provider(
+            provider_id, status="available", start_from=start_from, start_to=start_to
+        )
+    return appointments_by_status("available", start_from=start_from, start_to=start_to)
+
+
+def iter_available_appointments(
+    provider_id: Optional[int] = None,
+    start_from: Optional[datetime] = None,
+    start_to: Optional[datetime] = None,
+    after: Optional[Tuple[datetime, int]] = None,
+    chunk_size: int = _SLOT_CHUNK,
+) -> Iterator[Appointment]:
+    """Keyset-paged walk over open slots by (start, id); see data_access."""
+    while True:
+        params: list = ["available"]
+        where = "status = ?"
+        if provider_id is not None:
+            where += " AND provider_id = ?"
+            params.append(provider_id)
+        where += _range_clause(start_from, start_to, params)
+        if after is not None:
+            where += " AND (start > ? OR (start = ? AND id > ?))"
+            params += [_ts(after[0]), _ts(after[0]), after[1]]
+        with tracing.span("storage.sqlite_query"):
+            rows = _connect().execute(
+                f"SELECT data FROM appointments WHERE {where} ORDER BY start, id LIMIT ?",
+                (*params, chunk_size),
+            ).fetchall()
+            chunk = _validate_rows(Appointment, rows)
+        yield from chunk
+        if len(chunk) < chunk_size:
+            return
+        after = (chunk[-1].start, chunk[-1].id)
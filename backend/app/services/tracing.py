@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as _Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Per-request phase tracing: code wraps its phases in `span("name")`; the
+# HTTP middleware in main.py collects them for the current request, returns
+# them in a Server-Timing header and logs one JSON line per request.
+#
+# Spans recorded outside a request (startup, background prep workers) are
+# simply dropped.
+
+_TRACE_LOG = os.getenv("TRACE_LOG", "true").lower() == "true"
+
+# Opt-in sampling profiler: PROFILE_REQUESTS=true profiles every request.
+# PROFILE_ON_DEMAND=true also profiles single requests sent with an
+# `X-Profile: 1` header or `?profile=1`, one at a time; only turn it on where
+# untrusted clients can't reach the API. The newest PROFILE_MAX_FILES
+# profiles are kept.
+PROFILE_REQUESTS = os.getenv("PROFILE_REQUESTS", "false").lower() == "true"
+PROFILE_ON_DEMAND = os.getenv("PROFILE_ON_DEMAND", "false").lower() == "true"
+_PROFILE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000
+_PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+_PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("spans", default=None)
+
+logger = logging.getLogger("app.trace")
+if _TRACE_LOG and not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a phase of the current request (no-op outside a request)."""
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, time.perf_counter() - t0))
+
+
+def start_request():
+    return _spans.set([])
+
+
+def finish_request(token) -> List[Tuple[str, float]]:
+    spans = _spans.get() or []
+    _spans.reset(token)
+    return spans
+
+
+def _totals(spans: List[Tuple[str, float]]) -> Dict[str, Tuple[float, int]]:
+    totals: Dict[str, Tuple[float, int]] = {}
+    for name, seconds in spans:
+        total, n = totals.get(name, (0.0, 0))
+        totals[name] = (total + seconds, n + 1)
+    return totals
+
+
+def server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    """Server-Timing header value; repeated spans are summed."""
+    parts = [f"total;dur={total * 1000:.1f}"]
+    for name, (seconds, n) in _totals(spans).items():
+        part = f"{name};dur={seconds * 1000:.1f}"
+        if n > 1:
+            part += f';desc="{n}x"'
+        parts.append(part)
+    return ", ".join(parts)
+
+
+def log_request(
+    method: str, route: str, path: str, status: int, total: float,
+    spans: List[Tuple[str, float]], profile: Optional[str] = None,
+) -> None:
+    if not _TRACE_LOG:
+        return
+    record = {
+        "event": "request",
+        "method": method,
+        "route": route,
+        "path": path,
+        "status": status,
+        "duration_ms": round(total * 1000, 2),
+        "spans": {
+            name: {"ms": round(seconds * 1000, 2), "count": n}
+            for name, (seconds, n) in _totals(spans).items()
+        },
+    }
+    if profile:
+        record["profile"] = profile
+    logger.info(json.dumps(record))
+
+
+# ---------------------------------------------------------------------------
+# Sampling profiler
+# ---------------------------------------------------------------------------
+
+
+class SamplingProfiler:
+    """
+    Samples every thread's Python stack each PROFILE_SAMPLE_INTERVAL_MS and
+    counts identical stacks, in the collapsed ("folded") format used by
+    flamegraph.pl / speedscope. The event loop is shared, so an async
+    request's profile also contains whatever else the loop ran meanwhile.
+    """
+
+    def __init__(
+        self, interval: float = _PROFILE_INTERVAL, on_done: Optional[Callable[[], None]] = None
+    ):
+        self.interval = max(0.001, interval)
+        self.samples: _Counter = _Counter()
+        self.on_done = on_done
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, label: str) -> Path:
+        _PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in label).strip("_")
+        path = _PROFILE_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{slug}.folded"
+        with path.open("w") as f:
+            for stack, n in self.samples.most_common():
+                f.write(f"{stack} {n}\n")
+        return path
+
+    def finish(self, label: str) -> Path:
+        """stop() + dump() + prune old profiles. Blocks; don't call it on the event loop."""
+        try:
+            self.stop()
+            path = self.dump(label)
+            _prune_profiles()
+            return path
+        finally:
+            if self.on_done is not None:
+                self.on_done()
+
+
+def _prune_profiles() -> None:
+    # File names start with a timestamp, so name order is age order
+    files = sorted(_PROFILE_DIR.glob("*.folded"))
+    for old in files[:max(0, len(files) - _PROFILE_MAX_FILES)]:
+        old.unlink(missing_ok=True)
+
+
+_on_demand_slot = threading.Lock()
+
+
+def start_profiler(requested: bool) -> Optional[SamplingProfiler]:
+    """
+    A running profiler if this request gets profiled: always with
+    PROFILE_REQUESTS; when the client `requested` it, only with
+    PROFILE_ON_DEMAND and no other on-demand profile in progress.
+    """
+    if PROFILE_REQUESTS:
+        return SamplingProfiler().start()
+    if requested and PROFILE_ON_DEMAND and _on_demand_slot.acquire(blocking=False):
+        return SamplingProfiler(on_done=_on_demand_slot.release).start()
+    return None
@@ -0,0 +1,69 @@
+"""
+Migrate the JSON data files into the SQLite storage backend.
+
+    cd backend
+    python -m app.tools.import_json_to_sqlite [--data-dir data] [--db data/clinic.db]
+
+Pending bookings in appointments.journal.jsonl are replayed on top of
+appointments.json first, so nothing booked since the last compaction is lost.
+Existing rows in the target database are replaced.
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from ..models import Patient, Insurance, Appointment
+from ..services import sqlite_store
+from ..services.data_access import (
+    DATA_DIR,
+    PATIENTS_FILE,
+    INSURANCES_FILE,
+    APPOINTMENTS_FILE,
+    APPOINTMENTS_JOURNAL,
+)
+from ..services.journal import Journal
+
+
+def _read(path: Path) -> list:
+    with path.open() as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--db", type=Path, default=sqlite_store.SQLITE_PATH)
+    args = parser.parse_args()
+
+    sqlite_store.SQLITE_PATH = args.db
+    started = time.perf_counter()
+
+    patients = [Patient.model_validate(p) for p in _read(args.data_dir / PATIENTS_FILE)]
+    insurances = [Insurance.model_validate(i) for i in _read(args.data_dir / INSURANCES_FILE)]
+
+    appointments = {
+        a["id"]: Appointment.model_validate(a)
+        for a in _read(args.data_dir / APPOINTMENTS_FILE)
+    }
+    replayed = 0
+    for entry in Journal(args.data_dir / APPOINTMENTS_JOURNAL).replay():
+        appt = Appointment.model_validate(entry["appointment"])
+        appointments[appt.id] = appt
+        replayed += 1
+
+    sqlite_store.save_patients(patients)
+    sqlite_store.save_insurances(insurances)
+    sqlite_store.save_appointments(list(appointments.values()))
+    sqlite_store.close()
+
+    print(
+        f"Imported {len(patients)} patients, {len(insurances)} insurances, "
+        f"{len(appointments)} appointments ({replayed} journal records replayed) "
+        f"into {args.db} in {time.perf_counter() - started:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Pre-generate risk scores and prep summaries for upcoming booked appointments.
+
+    cd backend
+    python -m app.tools.pregenerate_prep [--from 2025-01-02] [--to 2025-01-03]
+        [--provider-id 1] [--concurrency 8] [--batch-size 100] [--force]
+
+Meant to run nightly (e.g. from cron) so that the next day's clinician
+schedule and prep summaries are served straight from stored data. Defaults
+to tomorrow. Appointments whose stored prep summary still matches their
+inputs are skipped; the rest are built through a bounded worker pool and
+written back in batches. Exits non-zero if any appointment failed, including
+summaries that only got the default template because the LLM call failed.
+
+With the JSON backend run it while the API is stopped (the API process
+keeps its own in-memory copy of the data); with STORAGE_BACKEND=sqlite it
+can run alongside the API.
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from ..models import Appointment
+from ..services import data_access, llm_client, prep_engine, risk_engine
+
+
+def _parse_date(value: str) -> date:
+    return date.fromisoformat(value)
+
+
+def _risk_is_stale(appointment: Appointment, max_age: timedelta) -> bool:
+    risk = appointment.clinical_risk
+    if risk is None:
+        return True
+    # A default score left behind by a failed LLM call is worth retrying
+    if risk_engine.is_transient(risk):
+        return True
+    return datetime.utcnow() - risk.generated_at.replace(tzinfo=None) > max_age
+
+
+async def _prepare(
+    appointment: Appointment, force: bool, max_age: timedelta
+) -> Tuple[Optional[Dict], bool, bool]:
+    """
+    Returns (field updates or None if already fresh, risk rebuilt, prep rebuilt).
+    """
+    patient = data_access.get_patient(appointment.patient_id)
+    if patient is None:
+        raise LookupError(f"patient {appointment.patient_id} not found")
+    insurance = data_access.get_insurance(patient.insurance_id)
+    if insurance is None:
+        raise LookupError(f"insurance {patient.insurance_id} not found")
+
+    risk = appointment.clinical_risk
+    risk_rebuilt = force or _risk_is_stale(appointment, max_age)
+    if risk_rebuilt:
+        risk = await risk_engine.calculate_risk(
+            patient=patient,
+            insurance=insurance,
+            proposed_reason=appointment.reason_for_visit or "",
+            history=data_access.patient_history(patient.id),
+        )
+
+    fp = prep_engine.prep_fingerprint(appointment, patient, insurance, risk)
+    if not force and prep_engine.is_fresh(appointment, fp):
+        if not risk_rebuilt:
+            return None, False, False
+        return {"clinical_risk": risk}, True, False
+
+    summary = await prep_engine.build_prep_summary(
+        appointment=appointment,
+        patient=patient,
+        insurance=insurance,
+        clinical_risk=risk,
+    )
+    if prep_engine.is_fallback(summary):
+        # Saving the default template as "ready" would hide the failure
+        # until the morning; leave the appointment for the next run
+        raise RuntimeError("LLM call failed, prep summary fell back to the default template")
+    update = {
+        "clinical_risk": risk,
+        "prep_summary": summary,
+        "prep_summary_status": "ready",
+        "prep_summary_fingerprint": fp,
+    }
+    return update, risk_rebuilt, True
+
+
+def _flush(pending: List[Tuple[Appointment, Dict]]) -> List[int]:
+    """
+    Persist a batch of updates. Updates are applied onto the version we read;
+    anything that changed since (cancelled, rebooked...) is reported back
+    instead of being overwritten.
+    """
+    items = [(a.model_copy(update=u), a.version) for a, u in pending]
+    _, conflicts = data_access.compare_and_swap_many(items)
+    pending.clear()
+    return conflicts
+
+
+async def run(
+    start_from: datetime,
+    start_to: datetime,
+    provider_id: Optional[int] = None,
+    concurrency: int = 8,
+    batch_size: int = 100,
+    force: bool = False,
+    risk_max_age: timedelta = timedelta(hours=24),
+) -> Dict:
+    if provider_id is not None:
+        appointments = data_access.appointments_for_provider(
+            provider_id, status="booked", start_from=start_from, start_to=start_to
+        )
+    else:
+        appointments = data_access.appointments_by_status(
+            "booked", start_from=start_from, start_to=start_to
+        )
+    appointments = [a for a in appointments if a.patient_id]
+
+    stats = {
+        "appointments": len(appointments),
+        "risk_generated": 0,
+        "prep_generated": 0,
+        "skipped_fresh": 0,
+        "conflicts": [],
+        "failures": [],
+    }
+    pending: List[Tuple[Appointment, Dict]] = []
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def work(appointment: Appointment) -> None:
+        async with sem:
+            try:
+                update, risk_rebuilt, prep_rebuilt = await _prepare(appointment, force, risk_max_age)
+            except Exception as e:
+                stats["failures"].append({"appointment_id": appointment.id, "error": repr(e)})
+                return
+        if update is None:
+            stats["skipped_fresh"] += 1
+            return
+        stats["risk_generated"] += risk_rebuilt
+        stats["prep_generated"] += prep_rebuilt
+        pending.append((appointment, update))
+        if len(pending) >= batch_size:
+            stats["conflicts"] += _flush(pending)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(work(a) for a in appointments))
+    if pending:
+        stats["conflicts"] += _flush(pending)
+    elapsed = time.perf_counter() - started
+
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["per_second"] = round(len(appointments) / elapsed, 1) if elapsed else 0.0
+    return stats
+
+
+async def _main(args: argparse.Namespace) -> Dict:
+    try:
+        return await run(
+            start_from=datetime.combine(args.start, datetime.min.time()),
+            start_to=datetime.combine(args.end, datetime.min.time()),
+            provider_id=args.provider_id,
+            concurrency=args.concurrency,
+            batch_size=args.batch_size,
+            force=args.force,
+            risk_max_age=timedelta(hours=args.risk_max_age_hours),
+        )
+    finally:
+        await llm_client.aclose()
+
+
+def main() -> None:
+    tomorrow = date.today() + timedelta(days=1)
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--from", dest="start", type=_parse_date, default=tomorrow,
+                        help="first day (inclusive), default tomorrow")
+    parser.add_argument("--to", dest="end", type=_parse_date, default=None,
+                        help="last day (exclusive), default the day after --from")
+    parser.add_argument("--provider-id", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild even if the stored summary is still fresh")
+    parser.add_argument("--risk-max-age-hours", type=float, default=24.0)
+    args = parser.parse_args()
+    if args.end is None:
+        args.end = args.start + timedelta(days=1)
+
+    data_access.warm_cache()
+    try:
+        stats = asyncio.run(_main(args))
+    finally:
+        data_access.close()
+
+    print(
+        f"{stats['appointments']} booked appointment(s) {args.start} -> {args.end}: "
+        f"{stats['prep_generated']} prep summaries and {stats['risk_generated']} risk scores "
+        f"generated, {stats['skipped_fresh']} already fresh "
+        f"in {stats['elapsed_seconds']:.2f}s ({stats['per_second']}/s)"
+    )
+    for cid in stats["conflicts"]:
+        print(f"  appointment {cid} changed during the run, left untouched")
+    for f in stats["failures"]:
+        print(f"  appointment {f['appointment_id']} failed: {f['error']}")
+    if stats["failures"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
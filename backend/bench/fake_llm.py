@@ -0,0 +1,163 @@
+"""
+Local stand-in for the OpenAI chat completions API, for offline load tests.
+
+    cd backend
+    python -m bench.fake_llm [--port 8900] [--latency-ms 300] [--jitter-ms 100]
+        [--error-rate 0.05] [--hang-rate 0.01]
+
+Point the API at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1 (and any
+OPENAI_API_KEY). Replies are canned JSON in the shape each engine expects
+(risk / intake / prep, picked from the system prompt); stream=true is
+supported. `--error-rate` answers with HTTP 500, `--hang-rate` never answers
+within any sane timeout. GET /stats returns call counters.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_STREAM_CHUNKS = 8
+
+
+def _content(messages: list) -> str:
+    system = messages[0]["content"] if messages else ""
+    if "triage assistant" in system:
+        score = random.randint(10, 90)
+        level = "high" if score >= 70 else "medium" if score >= 30 else "low"
+        return json.dumps({
+            "risk_score": score,
+            "risk_level": level,
+            "factors": ["synthetic_factor"],
+            "recommended_urgency": {
+                "high": "within_48_hours", "medium": "within_7_days", "low": "routine"
+            }[level],
+            "reason": "Fake LLM response.",
+        })
+    if "intake assistant" in system:
+        return json.dumps({
+            "reason_for_visit": "synthetic reason",
+            "triage_tags": ["synthetic"],
+            "suggested_urgency": "routine",
+            "summary": "Fake LLM intake summary.",
+        })
+    return json.dumps({
+        "todo_for_clinic": ["Review chart", "Confirm medications"],
+        "note_template": {
+            "subjective": ["Chief complaint"],
+            "objective": ["Vitals"],
+            "assessment": ["Working diagnosis"],
+            "plan": ["Follow-up"],
+        },
+    })
+
+
+def create_app(
+    latency_ms: float = 300.0,
+    jitter_ms: float = 100.0,
+    error_rate: float = 0.0,
+    hang_rate: float = 0.0,
+) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    stats: Dict[str, int] = {"calls": 0, "errors": 0, "hangs": 0, "streams": 0}
+
+    def delay() -> float:
+        return max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body: Dict[str, Any] = await request.json()
+        stats["calls"] += 1
+
+        roll = random.random()
+        if roll < hang_rate:
+            stats["hangs"] += 1
+            await asyncio.sleep(3600)
+        if roll < hang_rate + error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(delay() / 4)
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "injected failure", "type": "server_error"}},
+            )
+
+        content = _content(body.get("messages", []))
+        model = body.get("model", "fake")
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if body.get("stream"):
+            stats["streams"] += 1
+            step = max(1, len(content) // _STREAM_CHUNKS)
+            total = delay()
+
+            async def events():
+                for i in range(0, len(content), step):
+                    await asyncio.sleep(total / _STREAM_CHUNKS)
+                    chunk = {
+                        "id": cid, "object": "chat.completion.chunk", "created": created,
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + step]},
+                                     "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                done = {
+                    "id": cid, "object": "chat.completion.chunk", "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                }
+                yield f"data: {json.dumps(done)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        await asyncio.sleep(delay())
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": cid,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.hang_rate)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
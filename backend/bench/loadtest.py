@@ -0,0 +1,321 @@
+"""
+Offline load test for the API, against the fake LLM server.
+
+    cd backend
+    python -m bench.loadtest [--concurrency 20] [--requests 200]
+        [--scenarios available,book,schedule,prep]
+        [--llm-latency-ms 300] [--llm-error-rate 0.05] [--storage sqlite]
+        [--json-out results.json]
+
+Writes a synthetic dataset into a temp dir, starts bench.fake_llm and the
+API (uvicorn, pointed at both) as subprocesses, fires each scenario at the
+given concurrency and prints throughput, error rate and p50/p95/p99
+latency per scenario. No network access or OpenAI key needed.
+
+Pass --target http://host:port to drive an already-running API instead
+(it must have been started on the same dataset for `book` / `prep` to find
+their ids; the dataset is written to --data-dir if given).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from .synthetic import BACKEND_DIR, REASONS, write_dataset
+
+SCENARIOS = ("available", "book", "schedule", "prep")
+
+
+@dataclass
+class Result:
+    scenario: str
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0.0
+    llm_calls: int = 0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        # nearest-rank
+        k = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+        return ordered[k]
+
+    def summary(self) -> Dict:
+        n = len(self.latencies)
+        return {
+            "scenario": self.scenario,
+            "requests": n,
+            "errors": self.errors,
+            "error_rate": round(self.errors / n, 4) if n else 0.0,
+            "throughput_rps": round(n / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 1),
+            "p95_ms": round(self.percentile(95) * 1000, 1),
+            "p99_ms": round(self.percentile(99) * 1000, 1),
+            "llm_calls": self.llm_calls,
+            "statuses": self.statuses,
+        }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn(args: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env=env)
+
+
+def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+async def _run(
+    name: str,
+    client: httpx.AsyncClient,
+    make_request: Callable[[int], Awaitable[httpx.Response]],
+    requests: int,
+    concurrency: int,
+) -> Result:
+    result = Result(scenario=name)
+    next_index = iter(range(requests))
+
+    async def worker() -> None:
+        for i in next_index:
+            t0 = time.perf_counter()
+            try:
+                resp = await make_request(i)
+                key = str(resp.status_code)
+                ok = resp.status_code < 400
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+                ok = False
+            result.latencies.append(time.perf_counter() - t0)
+            result.statuses[key] = result.statuses.get(key, 0) + 1
+            if not ok:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def run_scenarios(
+    target: str,
+    llm_stats_url: Optional[str],
+    dataset: Dict[str, List[int]],
+    scenarios: List[str],
+    requests: int,
+    concurrency: int,
+    patients: int,
+    providers: int,
+    days: int,
+    prep_refresh: bool = False,
+    seed: int = 0,
+) -> List[Result]:
+    rng = random.Random(seed)
+    available = list(dataset["available_ids"])
+    rng.shuffle(available)
+    booked = list(dataset["booked_ids"])
+    start_day = datetime.now().date() + timedelta(days=1)
+
+    def reason(i: int) -> str:
+        # Unique suffix so the risk cache doesn't answer everything
+        return f"{rng.choice(REASONS)} ({i})"
+
+    def available_req(i: int):
+        return client.post("/appointments/available", json={
+            "patient_id": rng.randint(1, patients), "reason_for_visit": reason(i),
+        })
+
+    def book_req(i: int):
+        return client.post("/appointments/book", json={
+            "patient_id": rng.randint(1, patients),
+            "appointment_id": available[i % len(available)],
+            "reason_for_visit": reason(i),
+        })
+
+    def schedule_req(i: int):
+        return client.get("/clinician/schedule", params={
+            "provider_id": 101 + rng.randrange(providers),
+            "date_str": (start_day + timedelta(days=rng.randrange(max(1, days)))).isoformat(),
+        })
+
+    def prep_req(i: int):
+        params = {"refresh": "true"} if prep_refresh else None
+        return client.get(f"/prep-summary/{booked[i % len(booked)]}", params=params)
+
+    makers = {
+        "available": available_req,
+        "book": book_req,
+        "schedule": schedule_req,
+        "prep": prep_req,
+    }
+
+    results: List[Result] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, timeout=120.0, limits=limits) as client:
+        for name in scenarios:
+            before = _llm_calls(llm_stats_url)
+            result = await _run(name, client, makers[name], requests, concurrency)
+            result.llm_calls = _llm_calls(llm_stats_url) - before
+            results.append(result)
+    return results
+
+
+def _llm_calls(stats_url: Optional[str]) -> int:
+    if not stats_url:
+        return 0
+    try:
+        return httpx.get(stats_url, timeout=2.0).json()["calls"]
+    except (httpx.HTTPError, ValueError, KeyError):
+        return 0
+
+
+def print_report(results: List[Result]) -> None:
+    header = f"{'scenario':<10} {'reqs':>6} {'errors':>7} {'err%':>6} {'req/s':>8} " \
+             f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'llm':>6}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        s = r.summary()
+        print(
+            f"{s['scenario']:<10} {s['requests']:>6} {s['errors']:>7} "
+            f"{s['error_rate'] * 100:>5.1f}% {s['throughput_rps']:>8.1f} "
+            f"{s['p50_ms']:>8.1f} {s['p95_ms']:>8.1f} {s['p99_ms']:>8.1f} {s['llm_calls']:>6}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="per scenario")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--patients", type=int, default=200)
+    parser.add_argument("--appointments", type=int, default=5000)
+    parser.add_argument("--providers", type=int, default=10)
+    parser.add_argument("--booked-fraction", type=float, default=0.3)
+    parser.add_argument("--prep-refresh", action="store_true",
+                        help="GET /prep-summary?refresh=true (always hits the LLM)")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-hang-rate", type=float, default=0.0)
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (sqlite only)")
+    parser.add_argument("--target", default=None, help="use a running API instead of starting one")
+    parser.add_argument("--data-dir", type=Path, default=None)
+    parser.add_argument("--json-out", type=Path, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+    if args.workers > 1 and args.storage != "sqlite":
+        parser.error("--workers > 1 needs --storage sqlite (JSON storage is per-process)")
+
+    data_dir = args.data_dir or Path(tempfile.mkdtemp(prefix="loadtest-"))
+    dataset = write_dataset(
+        data_dir,
+        patients=args.patients,
+        appointments=args.appointments,
+        providers=args.providers,
+        booked_fraction=args.booked_fraction,
+        seed=args.seed,
+    )
+    days = args.appointments // args.providers // 18 + 1
+
+    procs: List[subprocess.Popen] = []
+    llm_stats_url = None
+    target = args.target
+    try:
+        if target is None:
+            llm_port, api_port = _free_port(), _free_port()
+            env = dict(os.environ)
+            procs.append(_spawn([
+                "-m", "bench.fake_llm", "--port", str(llm_port),
+                "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms),
+                "--error-rate", str(args.llm_error_rate), "--hang-rate", str(args.llm_hang_rate),
+            ], env))
+            llm_stats_url = f"http://127.0.0.1:{llm_port}/stats"
+            _wait_ready(llm_stats_url)
+
+            env.update({
+                "DATA_DIR": str(data_dir),
+                "STORAGE_BACKEND": args.storage,
+                "SQLITE_PATH": str(data_dir / "clinic.db"),
+                "OPENAI_ENABLED": "true",
+                "OPENAI_API_KEY": "loadtest",
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+            })
+            if args.storage == "sqlite":
+                subprocess.run(
+                    [sys.executable, "-m", "app.tools.import_json_to_sqlite",
+                     "--data-dir", str(data_dir), "--db", str(data_dir / "clinic.db")],
+                    cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL,
+                )
+            procs.append(_spawn([
+                "-m", "uvicorn", "app.main:app", "--port", str(api_port),
+                "--log-level", "warning", "--workers", str(args.workers),
+            ], env))
+            target = f"http://127.0.0.1:{api_port}"
+            _wait_ready(f"{target}/patients")
+
+        results = asyncio.run(run_scenarios(
+            target, llm_stats_url, dataset, scenarios,
+            requests=args.requests, concurrency=args.concurrency,
+            patients=args.patients, providers=args.providers, days=days,
+            prep_refresh=args.prep_refresh, seed=args.seed,
+        ))
+    finally:
+        for p in reversed(procs):
+            p.terminate()
+            try:
+                p.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+    print(
+        f"\n{args.requests} requests/scenario at concurrency {args.concurrency}, "
+        f"{args.storage} storage, LLM {args.llm_latency_ms:.0f}±{args.llm_jitter_ms:.0f} ms, "
+        f"error rate {args.llm_error_rate:.0%}, hang rate {args.llm_hang_rate:.0%}\n"
+    )
+    print_report(results)
+
+    if args.json_out:
+        args.json_out.write_text(json.dumps({
+            "config": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+            "results": [r.summary() for r in results],
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Scaling micro-benchmarks for data_access and the slot / schedule queries.
+
+    cd backend
+    python -m bench.scaling [--scales 1000,10000,100000] [--storage json|sqlite]
+        [--repeat 3] [--out bench/results/NAME.json] [--compare OLD.json]
+
+For each scale N it writes N synthetic patients and N appointments (plus
+N/100 insurances) and times, in-process:
+
+  load_*            cold (re-read from storage) and warm
+  find_* / get_*    100 random lookups (list scan vs index)
+  save_appointments full snapshot write
+  available_slots   the /appointments/available handler (rules-only risk),
+                    and serializing its response
+  clinician_schedule  the /clinician/schedule handler for one provider-day
+
+Results are saved as JSON (bench/results/ by default) and printed with a
+growth exponent per step: ~1 is linear, >1 superlinear. --compare prints
+the ratio against an earlier run. Add 1000000 to --scales for the 1M run
+(needs several GB of RAM).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from .synthetic import BACKEND_DIR, REASONS, write_dataset
+
+RESULTS_DIR = BACKEND_DIR / "bench" / "results"
+
+
+def _time(fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> float:
+    """Best-of-`repeat` wall time of fn() in seconds."""
+    best = math.inf
+    for _ in range(max(1, repeat)):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run_scale(n: int, storage: str, repeat: int, lookups: int, seed: int) -> Dict[str, float]:
+    # Imported here: STORAGE_BACKEND / OPENAI_ENABLED are read at import time
+    from app import main, responses
+    from app.models import AvailableSlotsRequest
+    from app.services import data_access, sqlite_store
+
+    # Time handlers and serialization separately (see bench.serialization)
+    responses.FAST_JSON_RESPONSES = False
+
+    rng = random.Random(seed)
+    providers = max(10, n // 5000)
+    data_dir = Path(tempfile.mkdtemp(prefix=f"scaling-{n}-"))
+    write_dataset(
+        data_dir,
+        patients=n,
+        appointments=n,
+        providers=providers,
+        insurances=max(3, n // 100),
+        seed=seed,
+    )
+
+    data_access.close()
+    data_access.DATA_DIR = data_dir
+    data_access.invalidate_cache()
+    if storage == "sqlite":
+        sqlite_store.close()
+        sqlite_store.SQLITE_PATH = data_dir / "clinic.db"
+        subprocess.run(
+            [sys.executable, "-m", "app.tools.import_json_to_sqlite",
+             "--data-dir", str(data_dir), "--db", str(sqlite_store.SQLITE_PATH)],
+            cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL,
+        )
+        cold = None
+    else:
+        cold = data_access.invalidate_cache
+
+    r: Dict[str, float] = {}
+    r["load_patients.cold"] = _time(data_access.load_patients, repeat, cold)
+    r["load_insurances.cold"] = _time(data_access.load_insurances, repeat, cold)
+    r["load_appointments.cold"] = _time(data_access.load_appointments, repeat, cold)
+    data_access.warm_cache()
+    r["load_appointments.warm"] = _time(data_access.load_appointments, repeat)
+
+    patients = data_access.load_patients()
+    insurances = data_access.load_insurances()
+    appointments = data_access.load_appointments()
+    pids = [rng.randint(1, n) for _ in range(lookups)]
+    iids = [rng.randint(1, len(insurances)) for _ in range(lookups)]
+    aids = [rng.randint(1, n) for _ in range(lookups)]
+
+    r["find_patient.x%d" % lookups] = _time(
+        lambda: [data_access.find_patient(patients, i) for i in pids], repeat)
+    r["find_insurance.x%d" % lookups] = _time(
+        lambda: [data_access.find_insurance(insurances, i) for i in iids], repeat)
+    r["find_appointment.x%d" % lookups] = _time(
+        lambda: [data_access.find_appointment(appointments, i) for i in aids], repeat)
+    r["get_patient.x%d" % lookups] = _time(
+        lambda: [data_access.get_patient(i) for i in pids], repeat)
+    r["get_appointment.x%d" % lookups] = _time(
+        lambda: [data_access.get_appointment(i) for i in aids], repeat)
+
+    r["save_appointments"] = _time(lambda: data_access.save_appointments(appointments), repeat)
+
+    reqs = [
+        AvailableSlotsRequest(patient_id=rng.randint(1, n), reason_for_visit=rng.choice(REASONS))
+        for _ in range(repeat)
+    ]
+    results = []
+
+    def available() -> None:
+        results.append(asyncio.run(main.available_slots(reqs[len(results) % len(reqs)])))
+
+    r["available_slots"] = _time(available, repeat)
+    resp = results[-1]
+    r["available_slots.serialize"] = _time(resp.model_dump_json, repeat)
+
+    day = (datetime.now().date() + timedelta(days=1)).isoformat()
+    r["clinician_schedule"] = _time(
+        lambda: main.clinician_schedule(provider_id=101 + rng.randrange(providers), date_str=day),
+        repeat,
+    )
+
+    data_access.close()
+    if storage == "sqlite":
+        sqlite_store.close()
+    return r
+
+
+def _growth(results: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+    """log(t2/t1) / log(n2/n1) between consecutive scales."""
+    scales = sorted(results, key=int)
+    out: Dict[str, Dict[str, float]] = {}
+    for lo, hi in zip(scales, scales[1:]):
+        for op, t_hi in results[hi].items():
+            t_lo = results[lo].get(op)
+            if t_lo and t_hi:
+                out.setdefault(op, {})[hi] = math.log(t_hi / t_lo) / math.log(int(hi) / int(lo))
+    return out
+
+
+def print_report(results: Dict[str, Dict[str, float]], baseline: Optional[Dict] = None) -> None:
+    scales = sorted(results, key=int)
+    growth = _growth(results)
+    ops = list(next(iter(results.values())).keys())
+
+    header = f"{'operation':<28}" + "".join(f"{int(s):>14,}" for s in scales) + "   growth"
+    print(header)
+    print("-" * len(header))
+    for op in ops:
+        cells = ""
+        for s in scales:
+            t = results[s].get(op)
+            cell = f"{t * 1000:.2f}ms" if t is not None else "-"
+            if baseline and t and baseline.get(s, {}).get(op):
+                cell = f"{t / baseline[s][op]:.2f}x {cell}"
+            cells += f"{cell:>14}"
+        exps = [growth.get(op, {}).get(s) for s in scales[1:]]
+        exps_txt = " ".join(f"{e:.2f}" if e is not None else "-" for e in exps)
+        flag = " <- superlinear" if any(e is not None and e > 1.2 for e in exps) else ""
+        print(f"{op:<28}{cells}   {exps_txt}{flag}")
+    if baseline:
+        print("\n(Nx = time relative to the --compare run)")
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default="1000,10000,100000")
+    parser.add_argument("--storage", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--lookups", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None)
+    args = parser.parse_args()
+
+    os.environ["STORAGE_BACKEND"] = args.storage
+    os.environ["OPENAI_ENABLED"] = "false"
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+
+    results: Dict[str, Dict[str, float]] = {}
+    for n in scales:
+        print(f"scale {n:,} ...", flush=True)
+        results[str(n)] = run_scale(n, args.storage, args.repeat, args.lookups, args.seed)
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())["results"]
+
+    print()
+    print_report(results, baseline)
+
+    out = args.out or RESULTS_DIR / (
+        f"scaling-{args.storage}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "storage": args.storage,
+            "repeat": args.repeat,
+            "lookups": args.lookups,
+        },
+        "results": results,
+        "growth": _growth(results),
+    }, indent=2))
+    print(f"\nsaved {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Response serialization cost: FastAPI's response_model path vs model_response().
+
+    cd backend
+    python -m bench.serialization [--patients 10000] [--appointments 20000]
+        [--repeat 5] [--out bench/results/NAME.json]
+
+For each endpoint it builds a real handler result from synthetic data and
+times turning it into response bytes both ways:
+
+  standard  fastapi.routing.serialize_response (re-validate against
+            response_model + jsonable pass) and JSONResponse (json.dumps)
+  fast      app.responses.ModelJSONResponse (pydantic-core dump_json)
+
+and checks that both produce the same JSON. The standard path is timed on
+the event loop; FastAPI runs it in a worker thread for sync handlers
+(/patients, /clinician/schedule), which costs a bit more in production.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from .synthetic import BACKEND_DIR, REASONS, write_dataset
+
+RESULTS_DIR = BACKEND_DIR / "bench" / "results"
+
+
+async def _per_call(fn: Callable[[], Any], repeat: int) -> float:
+    """Best-of-`repeat` mean seconds per call (loop count scaled to ~50ms)."""
+    t0 = time.perf_counter()
+    await fn()
+    number = max(1, int(0.05 / max(time.perf_counter() - t0, 1e-6)))
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        best = min(best, (time.perf_counter() - t0) / number)
+    return best
+
+
+def _cases() -> List[Tuple[str, str, str, Any, Any]]:
+    """(label, method, route path, handler result, response type) per endpoint."""
+    from fastapi import Response
+
+    from app import main, responses
+    from app.models import (
+        AvailableSlotsRequest,
+        AvailableSlotsResponse,
+        BookAppointmentRequest,
+        BookingSummary,
+        ClinicianScheduleItem,
+        Patient,
+        PatientAppointmentsResponse,
+    )
+    from app.services import data_access
+
+    # Handlers hand back their models instead of the fast response
+    responses.FAST_JSON_RESPONSES = False
+
+    appts = data_access.load_appointments()
+    booked = [a for a in appts if a.status == "booked"]
+    busiest_patient = max(
+        {a.patient_id for a in booked},
+        key=lambda pid: len(data_access.appointments_for_patient(pid)),
+    )
+    day = (datetime.now().date() + timedelta(days=1)).isoformat()
+
+    # Synthetic bookings carry no risk; book one for real to replay it
+    slot = next(a for a in appts if a.status == "available")
+    booking = asyncio.run(main.book_appointment(BookAppointmentRequest(
+        patient_id=1, appointment_id=slot.id, reason_for_visit=REASONS[0],
+    )))
+
+    def slots(limit: int):
+        req = AvailableSlotsRequest(patient_id=1, reason_for_visit=REASONS[0], limit=limit)
+        return asyncio.run(main.available_slots(req))
+
+    return [
+        ("/patients limit=50", "GET", "/patients",
+         main.list_patients(Response(), query=None, limit=50, cursor=None), List[Patient]),
+        ("/patients limit=200", "GET", "/patients",
+         main.list_patients(Response(), query=None, limit=200, cursor=None), List[Patient]),
+        ("/clinician/schedule day", "GET", "/clinician/schedule",
+         main.clinician_schedule(provider_id=101, date_str=day), List[ClinicianScheduleItem]),
+        ("/clinician/schedule all", "GET", "/clinician/schedule",
+         main.clinician_schedule(provider_id=101, date_str=None), List[ClinicianScheduleItem]),
+        ("/patients/{id}/appointments", "GET", "/patients/{patient_id}/appointments",
+         main.get_patient_appointments(busiest_patient), PatientAppointmentsResponse),
+        ("/appointments/book", "POST", "/appointments/book", booking, BookingSummary),
+        ("/appointments/{id}/details", "GET", "/appointments/{appointment_id}/details",
+         main.get_appointment_details(slot.id), BookingSummary),
+        ("/appointments/available 100", "POST", "/appointments/available",
+         slots(100), AvailableSlotsResponse),
+        ("/appointments/available 500", "POST", "/appointments/available",
+         slots(500), AvailableSlotsResponse),
+    ]
+
+
+def run(patients: int, appointments: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    data_dir = Path(tempfile.mkdtemp(prefix="serialization-"))
+    write_dataset(data_dir, patients=patients, appointments=appointments, providers=10)
+    os.environ["DATA_DIR"] = str(data_dir)
+    os.environ["STORAGE_BACKEND"] = "json"
+    os.environ["OPENAI_ENABLED"] = "false"
+    os.environ.setdefault("TRACE_LOG", "false")
+
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import APIRoute, serialize_response
+
+    from app import main
+    from app.responses import ModelJSONResponse
+    from app.services import data_access
+
+    data_access.DATA_DIR = data_dir
+    data_access.invalidate_cache()
+
+    routes = {
+        (r.path, m): r for r in main.app.routes if isinstance(r, APIRoute) for m in r.methods
+    }
+    results: Dict[str, Dict[str, float]] = {}
+
+    for label, method, path, content, type_ in _cases():
+        field = routes[(path, method)].response_field
+
+        async def standard():
+            return JSONResponse(await serialize_response(field=field, response_content=content)).body
+
+        async def fast():
+            return ModelJSONResponse(content, type_).body
+
+        std_body, fast_body = asyncio.run(standard()), asyncio.run(fast())
+        if json.loads(std_body) != json.loads(fast_body):
+            raise SystemExit(f"{label}: fast path output differs from response_model output")
+
+        async def measure():
+            return await _per_call(standard, repeat), await _per_call(fast, repeat)
+
+        t_std, t_fast = asyncio.run(measure())
+        results[label] = {
+            "bytes": len(fast_body),
+            "standard_us": t_std * 1e6,
+            "fast_us": t_fast * 1e6,
+            "saved_us": (t_std - t_fast) * 1e6,
+            "speedup": t_std / t_fast,
+        }
+
+    data_access.close()
+    return results
+
+
+def print_report(results: Dict[str, Dict[str, float]]) -> None:
+    header = f"{'endpoint':<32}{'bytes':>10}{'standard':>12}{'fast':>12}{'saved':>12}{'speedup':>9}"
+    print(header)
+    print("-" * len(header))
+    for label, r in results.items():
+        print(
+            f"{label:<32}{r['bytes']:>10,}{r['standard_us']:>10.0f}us{r['fast_us']:>10.0f}us"
+            f"{r['saved_us']:>10.0f}us{r['speedup']:>8.1f}x"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--patients", type=int, default=10000)
+    parser.add_argument("--appointments", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=Path, default=None)
+    args = parser.parse_args()
+
+    results = run(args.patients, args.appointments, args.repeat)
+    print_report(results)
+
+    out = args.out or RESULTS_DIR / f"serialization-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "patients": args.patients,
+            "appointments": args.appointments,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }, indent=2))
+    print(f"\nsaved {out}")
+
+
+if __name__ == "__main__":
+    main()
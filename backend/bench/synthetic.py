@@ -0,0 +1,132 @@
+"""
+Synthetic clinic data for benchmarks and load tests.
+
+Patients and insurances are cloned from the sample records in data/ (with
+new ids); appointments are a grid of 30-minute slots per provider starting
+tomorrow, some of them booked.
+"""
+
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+SAMPLE_DIR = BACKEND_DIR / "data"
+
+REASONS = [
+    "annual physical",
+    "medication refill",
+    "follow up on blood pressure",
+    "persistent cough",
+    "knee pain after running",
+    "diabetes check-in",
+    "feeling more tired than usual",
+    "rash on forearm",
+    "shortness of breath when climbing stairs",
+    "anxiety and trouble sleeping",
+]
+
+SLOTS_PER_DAY = 18  # 08:00 - 17:00
+
+
+def _write_json_list(path: Path, records: Iterable[Dict]) -> None:
+    # One record per line; keeps memory flat for the 1M-row datasets
+    with path.open("w", encoding="utf-8") as f:
+        f.write("[\n")
+        first = True
+        for r in records:
+            if not first:
+                f.write(",\n")
+            f.write(json.dumps(r, default=str))
+            first = False
+        f.write("\n]\n")
+
+
+def _samples(filename: str) -> List[Dict]:
+    with (SAMPLE_DIR / filename).open() as f:
+        return json.load(f)
+
+
+def write_dataset(
+    data_dir: Path,
+    patients: int = 200,
+    appointments: int = 2000,
+    providers: int = 10,
+    insurances: Optional[int] = None,
+    booked_fraction: float = 0.3,
+    start: Optional[datetime] = None,
+    seed: int = 0,
+) -> Dict[str, List[int]]:
+    """
+    Write patients.json, insurances.json and appointments.json into
+    `data_dir` (`insurances=None` keeps just the sample plans). Returns the
+    ids of the available and booked appointments.
+    """
+    rng = random.Random(seed)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    if start is None:
+        start = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+    day0 = start.replace(hour=8, minute=0, second=0, microsecond=0)
+
+    insurance_samples = _samples("insurances.json")
+    if insurances is None:
+        insurance_rows = insurance_samples
+    else:
+        insurance_rows = [
+            dict(insurance_samples[n % len(insurance_samples)], id=n + 1,
+                 member_id=f"SYN{n + 1:08d}")
+            for n in range(insurances)
+        ]
+    insurance_ids = [i["id"] for i in insurance_rows]
+    _write_json_list(data_dir / "insurances.json", insurance_rows)
+
+    patient_samples = _samples("patients.json")
+
+    def gen_patients():
+        for pid in range(1, patients + 1):
+            p = dict(patient_samples[(pid - 1) % len(patient_samples)])
+            p["id"] = pid
+            p["last_name"] = f"{p['last_name']}{pid}"
+            p["email"] = f"patient{pid}@example.com"
+            p["phone"] = f"555{pid:07d}"[-10:]
+            p["insurance_id"] = insurance_ids[pid % len(insurance_ids)]
+            yield p
+
+    _write_json_list(data_dir / "patients.json", gen_patients())
+
+    available_ids: List[int] = []
+    booked_ids: List[int] = []
+    created_at = (day0 - timedelta(days=7)).isoformat(sep=" ")
+
+    def gen_appointments():
+        for n in range(appointments):
+            aid = n + 1
+            provider = n % providers
+            slot = n // providers
+            day, slot_of_day = divmod(slot, SLOTS_PER_DAY)
+            when = day0 + timedelta(days=day, minutes=30 * slot_of_day)
+            booked = rng.random() < booked_fraction
+            (booked_ids if booked else available_ids).append(aid)
+            yield {
+                "id": aid,
+                "status": "booked" if booked else "available",
+                "start": when.isoformat(sep=" "),
+                "slot_duration": 30,
+                "patient_id": rng.randint(1, patients) if booked else None,
+                "provider_id": 101 + provider,
+                "location": "Main Clinic",
+                "visit_type": "in_person",
+                "created_at": created_at,
+                "source": "system",
+                "reason_for_visit": rng.choice(REASONS) if booked else None,
+                "clinical_risk": None,
+                "intake_narrative": None,
+                "intake_structured": None,
+                "prep_summary": None,
+                "final_note": None,
+            }
+
+    _write_json_list(data_dir / "appointments.json", gen_appointments())
+    return {"available_ids": available_ids, "booked_ids": booked_ids}
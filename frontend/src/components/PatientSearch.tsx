@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import api from "../api/client";
 
 export type Patient = {
@@ -14,27 +14,49 @@ type Props = {
   selectedPatientId: number | null;
 };
 
+const PAGE_SIZE = 20;
+const DEBOUNCE_MS = 150;
+// One letter matches a large share of the panel; wait for the second
+const MIN_QUERY_LENGTH = 2;
+
 const PatientSearch: React.FC<Props> = ({ onSelect, selectedPatientId }) => {
   const [query, setQuery] = useState("");
   const [patients, setPatients] = useState<Patient[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
+  // Ignore responses to keystrokes that have since been superseded
+  const requestId = useRef(0);
 
-  const loadPatients = async (q?: string) => {
+  const loadPatients = async (q: string, cursor?: string) => {
+    const id = ++requestId.current;
     setLoading(true);
-    const res = await api.get<Patient[]>("/patients", {
-      params: q ? { query: q } : {},
-    });
-    setPatients(res.data);
-    setLoading(false);
+    try {
+      const res = await api.get<Patient[]>("/patients", {
+        params: {
+          limit: PAGE_SIZE,
+          ...(q ? { query: q } : {}),
+          ...(cursor ? { cursor } : {}),
+        },
+      });
+      if (id !== requestId.current) return;
+      setPatients((prev) => (cursor ? [...prev, ...res.data] : res.data));
+      setNextCursor(res.headers["x-next-cursor"] ?? null);
+    } finally {
+      if (id === requestId.current) setLoading(false);
+    }
   };
 
+  // Search as you type (debounced)
   useEffect(() => {
-    loadPatients();
-  }, []);
+    const q = query.trim();
+    if (q && q.length < MIN_QUERY_LENGTH) return;
+    const timer = setTimeout(() => loadPatients(q), q ? DEBOUNCE_MS : 0);
+    return () => clearTimeout(timer);
+  }, [query]);
 
   const handleSearch = (e: React.FormEvent) => {
     e.preventDefault();
-    loadPatients(query);
+    loadPatients(query.trim());
   };
 
   return (
@@ -73,6 +95,15 @@ const PatientSearch: React.FC<Props> = ({ onSelect, selectedPatientId }) => {
           );
         })}
       </ul>
+      {nextCursor && (
+        <button
+          type="button"
+          disabled={loading}
+          onClick={() => loadPatients(query.trim(), nextCursor)}
+        >
+          Load more
+        </button>
+      )}
     </div>
   );
 };
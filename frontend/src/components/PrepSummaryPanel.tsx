@@ -79,7 +79,20 @@ const PrepSummaryPanel: React.FC<Props> = ({ summary }) => {
     }
   };
 
-  if (!prep_summary) return null;
+  if (!prep_summary) {
+    const status = summary?.appointment?.prep_summary_status;
+    if (status !== "pending" && status !== "failed") return null;
+    return (
+      <div className="card prep-card">
+        <h2>4. Clinician Pre-Visit Preparation</h2>
+        <p className="subtext">
+          {status === "pending"
+            ? "Preparing pre-visit summary…"
+            : "Pre-visit summary could not be generated."}
+        </p>
+      </div>
+    );
+  }
 
   return (
     <div className="card prep-card">
@@ -1,10 +1,12 @@
-import React, { useState, useMemo, useEffect } from "react";
+import React, { useState, useMemo, useEffect, useRef } from "react";
 import api from "../api/client";
 import { RiskBadge } from "./RiskBadge";
 import type { Patient } from "./PatientSearch";
 import ErrorBanner from "./ErrorBanner";
 import type {
   Appointment,
+  AvailableSlot,
+  AvailableSlotsResponse,
   ClinicalRisk,
   BookingSummaryResponse,
   RecommendedSlot,
@@ -18,6 +20,10 @@ type Props = {
 
 type OtherSlotsFilterRange = "week" | "month";
 
+// Prep summaries are generated in the background after booking
+const PREP_POLL_INTERVAL_MS = 1500;
+const PREP_POLL_MAX_ATTEMPTS = 40;
+
 const RiskAwareScheduler: React.FC<Props> = ({ patient, onBooked }) => {
   const [intakeNarrative, setIntakeNarrative] = useState("");
   const [intakeResult, setIntakeResult] = useState<IntakeResult | null>(null);
@@ -28,7 +34,8 @@ const RiskAwareScheduler: React.FC<Props> = ({ patient, onBooked }) => {
   const [recommendedSlots, setRecommendedSlots] = useState<RecommendedSlot[]>(
     []
   );
-  const [otherSlots, setOtherSlots] = useState<Appointment[]>([]);
+  const [otherSlots, setOtherSlots] = useState<AvailableSlot[]>([]);
+  const [slotsCursor, setSlotsCursor] = useState<string | null>(null);
 
   const [loadingIntake, setLoadingIntake] = useState(false);
   const [loadingSlots, setLoadingSlots] = useState(false);
@@ -45,8 +52,12 @@ const RiskAwareScheduler: React.FC<Props> = ({ patient, onBooked }) => {
   const [loadingBooked, setLoadingBooked] = useState(false);
   const [selectedBookedId, setSelectedBookedId] = useState<number | null>(null);
 
+  // Lets background polls notice the user moved on to another patient
+  const currentPatientId = useRef<number | null>(null);
+
   // 🔁 Reset everything when the selected patient changes
   useEffect(() => {
+    currentPatientId.current = patient?.id ?? null;
     setIntakeNarrative("");
     setIntakeResult(null);
     setError(null);
@@ -54,6 +65,7 @@ const RiskAwareScheduler: React.FC<Props> = ({ patient, onBooked }) => {
     setRisk(null);
     setRecommendedSlots([]);
     setOtherSlots([]);
+    setSlotsCursor(null);
     setLoadingIntake(false);
     setLoadingSlots(false);
     setBookingSlotId(null);
@@ -83,18 +95,29 @@ const RiskAwareScheduler: React.FC<Props> = ({ patient, onBooked }) => {
     }
   };
 
-  const handleGetSlots = async () => {
+  // Slots come in pages, earliest first; `cursor` fetches the next one
+  const handleGetSlots = async (cursor?: string) => {
     if (!patient || !reason.trim()) return;
     setError(null);
     setLoadingSlots(true);
     try {
-      const res = await api.post("/appointments/available", {
-        patient_id: patient.id,
-        reason_for_visit: reason,
-      });
-      setRisk(res.data.risk);
-      setRecommendedSlots(res.data.recommended_slots || []);
-      setOtherSlots(res.data.other_slots || []);
+      const res = await api.post<AvailableSlotsResponse>(
+        "/appointments/available",
+        {
+          patient_id: patient.id,
+          reason_for_visit: reason,
+          ...(cursor ? { cursor } : {}),
+        }
+      );
+      const data = res.data;
+      setRisk(data.risk);
+      setRecommendedSlots((prev) =>
+        cursor ? [...prev, ...data.recommended_slots] : data.recommended_slots
+      );
+      setOtherSlots((prev) =>
+        cursor ? [...prev, ...data.other_slots] : data.other_slots
+      );
+      setSlotsCursor(data.next_cursor);
     } catch (err: any) {
       setError(err.message || "Failed to fetch available slots.");
     } finally {
@@ -112,7 +135,11 @@ const RiskAwareScheduler: React.FC<Props> = ({ patient, onBooked }) => {
         appointment_id: slotId,
         reason_for_visit: reason,
       });
-      onBooked(res.data);
+      const booked: BookingSummaryResponse = res.data;
+      onBooked(booked);
+      if (!booked.prep_summary) {
+        void pollPrepSummary(booked.appointment.id);
+      }
 
       // Refresh booked list if panel is open
       if (showBooked) {
@@ -125,6 +152,27 @@ const RiskAwareScheduler: React.FC<Props> = ({ patient, onBooked }) => {
     }
   };
 
+  const pollPrepSummary = async (appointmentId: number) => {
+    const patientId = currentPatientId.current;
+    for (let attempt = 0; attempt < PREP_POLL_MAX_ATTEMPTS; attempt++) {
+      await new Promise((resolve) => setTimeout(resolve, PREP_POLL_INTERVAL_MS));
+      if (currentPatientId.current !== patientId) return;
+      try {
+        const res = await api.get<BookingSummaryResponse>(
+          `/appointments/${appointmentId}/details`
+        );
+        const status = res.data.appointment.prep_summary_status;
+        if (res.data.prep_summary || status === "failed") {
+          onBooked(res.data);
+          return;
+        }
+      } catch (err) {
+        console.error("Failed to poll prep summary", err);
+        return;
+      }
+    }
+  };
+
   const fetchBookedAppointments = async () => {
     if (!patient) return;
     setLoadingBooked(true);
@@ -249,7 +297,10 @@ const RiskAwareScheduler: React.FC<Props> = ({ patient, onBooked }) => {
               onChange={(e) => setReason(e.target.value)}
             />
           </label>
-          <button onClick={handleGetSlots} disabled={loadingSlots || !reason}>
+          <button
+            onClick={() => handleGetSlots()}
+            disabled={loadingSlots || !reason}
+          >
             {loadingSlots ? "Calculating..." : "Get Recommended Slots"}
           </button>
 
@@ -356,6 +407,16 @@ const RiskAwareScheduler: React.FC<Props> = ({ patient, onBooked }) => {
             </div>
           )}
 
+          {slotsCursor && (
+            <button
+              type="button"
+              onClick={() => handleGetSlots(slotsCursor)}
+              disabled={loadingSlots}
+            >
+              {loadingSlots ? "Loading..." : "Load more slots"}
+            </button>
+          )}
+
           {/* Booked appointments panel */}
           {showBooked && bookedAppointments.length > 0 && (
             <div className="slots">
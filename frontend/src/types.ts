@@ -23,21 +23,40 @@ export type Appointment = {
   intake_narrative?: string | null;
   intake_structured?: any | null;
   prep_summary?: any | null;
+  prep_summary_status?: "ready" | "pending" | "failed" | "not_generated" | null;
   final_note?: any | null;
+  version?: number;
 };
 
 // This matches your backend BookingSummary / BookingSummaryResponse
 export type BookingSummaryResponse = {
   appointment: Appointment;
   risk: ClinicalRisk;
-  prep_summary: any;
+  prep_summary: any | null; // null while generated in the background
+};
+
+// Lean open-slot view returned by /appointments/available
+export type AvailableSlot = {
+  id: number;
+  start: string;
+  slot_duration: number;
+  provider_id?: number | null;
+  location?: string | null;
+  visit_type?: string | null;
 };
 
 export type RecommendedSlot = {
-  appointment: Appointment;
+  appointment: AvailableSlot;
   score_adjustment: number;
 };
 
+export type AvailableSlotsResponse = {
+  risk: ClinicalRisk;
+  recommended_slots: RecommendedSlot[];
+  other_slots: AvailableSlot[];
+  next_cursor: string | null;
+};
+
 export type IntakeResult = {
   reason_for_visit: string;
   triage_tags: string[];